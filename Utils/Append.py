@@ -0,0 +1,75 @@
+import os
+
+import pandas as pd
+from dateutil import parser
+
+from Utils.Get import get_columns_specs, get_duration, get_specs_columns, get_y_data
+from Utils.Store import get_format, load_features, load_metadata, save_features
+
+
+def get_protocol_metadata(df, dates, time_window_length, non_overlapping_length, specs=None):
+	"""
+	Get what is saved with the features of a protocol run, to be able to extend them later
+	:param pd.DataFrame df: the used DataFrame
+	:param list dates: list of 2 elements : the bounds
+	:param int time_window_length: the length of the window
+	:param int non_overlapping_length: the number of non overlapping element
+	:param specs: the specifications computed, see get_columns_specs
+	:return: the metadata
+	:rtype: dict
+	"""
+	columns = list(specs) if isinstance(specs, dict) else list(df.columns)
+	return {"start": str(pd.Timestamp(parser.parse(dates[0]))),
+	        "dates": [str(date) for date in dates],
+	        "time_window_length": time_window_length,
+	        "non_overlapping_length": non_overlapping_length,
+	        "columns": [str(column) for column in df.columns],
+	        "data_end": str(df.index.max()),
+	        "specs": {str(column): names for column, names in get_columns_specs(columns, specs).items()}}
+
+
+def update_features(path, df, dates, time_window_length, non_overlapping_length, since=None, specs=None):
+	"""
+	Extend saved features with the rows added to the dataframe, only the new windows and the windows containing new
+	rows are computed. The features are computed and saved as a whole if the file does not exist yet
+	:param str path: the features, saved by save_features in the npy or parquet format with get_protocol_metadata
+	:param pd.DataFrame df: the whole DataFrame, with the new rows
+	:param list dates: list of 2 elements : the bounds, dates[1] being usually later than for the saved features
+	:param int time_window_length: the length of the window
+	:param int non_overlapping_length: the number of non overlapping element
+	:param since: the date of the first new or modified row, the rows after the last saved one if None
+	:param specs: the specifications computed, see get_columns_specs
+	:return: df_specs, y_data, all the features
+	:rtype: (pd.DataFrame, list)
+	"""
+	if get_format(path) == "pickle":
+		raise ValueError("The pickle files can not be extended, use the npy or parquet format")
+	metadata = get_protocol_metadata(df, dates, time_window_length, non_overlapping_length, specs)
+	if not os.path.exists(path):
+		df_specs = get_specs_columns(df, dates, time_window_length, non_overlapping_length, specs=specs)
+		y_data = get_y_data(dates, time_window_length, non_overlapping_length)
+		save_features(path, df_specs, y_data, metadata)
+		return df_specs, y_data
+
+	saved_metadata = load_metadata(path)
+	# The features saved before the specifications were recorded are the ones of SPECS_LIST
+	saved_metadata.setdefault("specs", get_protocol_metadata(df, dates, time_window_length,
+	                                                         non_overlapping_length)["specs"])
+	for key in ("start", "time_window_length", "non_overlapping_length", "columns", "specs"):
+		if saved_metadata.get(key) != metadata[key]:
+			raise ValueError(f"The saved features do not have the same {key} : {saved_metadata.get(key)}")
+
+	# The windows ending after 'since' are the first ones which may contain new rows
+	since = pd.Timestamp(saved_metadata["data_end"] if since is None else since)
+	start = pd.Timestamp(metadata["start"])
+	last_valid = (since - start - get_duration(time_window_length)) // get_duration(non_overlapping_length)
+	df_specs, y_data = load_features(path)
+	first_window = min(max(last_valid + 1, 0), len(df_specs))
+
+	df_new = get_specs_columns(df, dates, time_window_length, non_overlapping_length, first_window=first_window,
+	                           specs=specs)
+	y_new = get_y_data(dates, time_window_length, non_overlapping_length, first_window=first_window)
+	df_specs = pd.concat([df_specs.iloc[:first_window], df_new], axis=0, ignore_index=True)
+	y_data = y_data[:first_window] + y_new
+	save_features(path, df_specs, y_data, metadata)
+	return df_specs, y_data
@@ -0,0 +1,109 @@
+import hashlib
+import json
+import os
+import shutil
+
+import pandas as pd
+
+from Utils.Get import get_columns_specs, get_specs_columns, get_y_data
+from Utils.Store import load_features, save_features
+
+
+def get_cache_key(df, dates, time_window_length, non_overlapping_length, specs=None):
+	"""
+	Get the key of the cache entry of a protocol run, from the content of the dataframe and the parameters
+	:param pd.DataFrame df: the used DataFrame
+	:param list dates: list of 2 elements : the bounds
+	:param int time_window_length: the length of the window
+	:param int non_overlapping_length: the number of non overlapping element
+	:param specs: the specifications computed, see get_columns_specs
+	:return: the key, an hexadecimal hash
+	:rtype: str
+	"""
+	columns = list(specs) if isinstance(specs, dict) else list(df.columns)
+	key = hashlib.sha256()
+	key.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+	key.update(json.dumps({"columns": [str(column) for column in df.columns],
+	                       "dtypes": [str(dtype) for dtype in df.dtypes],
+	                       "dates": [str(date) for date in dates],
+	                       "time_window_length": time_window_length,
+	                       "non_overlapping_length": non_overlapping_length,
+	                       "specs": [[str(column), names] for column, names in
+	                                 get_columns_specs(columns, specs).items()]}).encode())
+	return key.hexdigest()
+
+
+def get_cache_size(path):
+	"""
+	Get the size of a cache entry (or of the whole cache)
+	:param str path: the folder
+	:return: the size in bytes
+	:rtype: int
+	"""
+	size = 0
+	for folder, _, files in os.walk(path):
+		size += sum(os.path.getsize(os.path.join(folder, file)) for file in files)
+	return size
+
+
+def evict_cache(cache_path, max_size, keep=None):
+	"""
+	Remove the least recently used entries until the cache is not bigger than max_size
+	:param str cache_path: the folder of the cache
+	:param int max_size: the maximum size of the cache in bytes
+	:param str keep: a key which is never removed
+	"""
+	entries = [entry for entry in os.scandir(cache_path)
+	           if entry.is_dir() and entry.name != keep and not entry.name.endswith(".tmp")]
+	sizes = {entry.path: get_cache_size(entry.path) for entry in entries}
+	total = sum(sizes.values()) + (get_cache_size(os.path.join(cache_path, keep)) if keep else 0)
+	for entry in sorted(entries, key=lambda entry: entry.stat().st_mtime):
+		if total <= max_size:
+			break
+		shutil.rmtree(entry.path, ignore_errors=True)
+		total -= sizes[entry.path]
+
+
+def get_cached_specs(df, dates, time_window_length, non_overlapping_length, cache_path, max_size=2 ** 30,
+                     specs=None, categorical=False):
+	"""
+	Get the specifications of all the columns and the seasons, from the cache when they have already been computed
+	The cache folder contains one entry by key (see get_cache_key), the least recently used are removed when the
+	cache gets bigger than max_size
+	:param pd.DataFrame df: the used DataFrame
+	:param list dates: list of 2 elements : the bounds
+	:param int time_window_length: the length of the window
+	:param int non_overlapping_length: the number of non overlapping element
+	:param str cache_path: the folder of the cache
+	:param int max_size: the maximum size of the cache in bytes
+	:param specs: the specifications computed, see get_columns_specs
+	:param bool categorical: True to get the seasons as a pd.Categorical (int8 codes) instead of a list of strings
+	:return: df_specs, y_data, as computed by get_specs_columns and get_y_data
+	:rtype: (pd.DataFrame, list)
+	"""
+	key = get_cache_key(df, dates, time_window_length, non_overlapping_length, specs)
+	entry = os.path.join(cache_path, key)
+	if os.path.isdir(entry):
+		try:
+			df_specs, y_data = load_features(entry, categorical=categorical)
+			# The modification time of an entry is the time it was last used
+			os.utime(entry)
+			return df_specs, y_data
+		except (OSError, ValueError, KeyError):
+			# Incomplete entry, computed again
+			shutil.rmtree(entry, ignore_errors=True)
+
+	df_specs = get_specs_columns(df, dates, time_window_length, non_overlapping_length, specs=specs)
+	y_data = get_y_data(dates, time_window_length, non_overlapping_length, categorical=categorical)
+
+	# Written aside then renamed, so that an entry is always complete
+	os.makedirs(cache_path, exist_ok=True)
+	temporary = f"{entry}.{os.getpid()}.tmp"
+	save_features(temporary, df_specs, y_data)
+	try:
+		os.rename(temporary, entry)
+	except OSError:
+		# Saved by another process in the meantime
+		shutil.rmtree(temporary, ignore_errors=True)
+	evict_cache(cache_path, max_size, keep=key)
+	return df_specs, y_data
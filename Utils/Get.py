@@ -2,9 +2,21 @@ import pandas as pd
 import numpy as np
 import datetime
 from dateutil import parser
-from scipy import stats
+from numpy.lib.stride_tricks import sliding_window_view
 
+from Utils.Profiling import profile_stage, profiled
+from Utils.Specs import SPECS_LIST, compute_specs, get_specs_names
 
+
+# First day (season, month, day) of each season
+# These are the seasons of get_season, in which the winter actually starts on December 23
+ASTRONOMICAL_SEASONS = [("spring", 3, 20), ("summer", 6, 21), ("autumn", 9, 22), ("winter", 12, 23)]
+METEOROLOGICAL_SEASONS = [("spring", 3, 1), ("summer", 6, 1), ("autumn", 9, 1), ("winter", 12, 1)]
+# The same dates give the opposite seasons in the southern hemisphere
+SOUTHERN_SEASONS = {"spring": "autumn", "summer": "winter", "autumn": "spring", "winter": "summer"}
+
+
+@profiled
 def get_data(path, sep=',', header=0, txt=True) -> pd.DataFrame:
 	"""
 	Create the dataframe from the csv and print some information about it
@@ -31,6 +43,49 @@ def get_data(path, sep=',', header=0, txt=True) -> pd.DataFrame:
 	return data
 
 
+@profiled
+def get_dataset(paths, date_column="date", sep=',', float32=False, dtype=None, chunksize=None, engine=None) -> pd.DataFrame:
+	"""
+	Create the dataframe of one or several csv files, indexed by date, in a single read of each file :
+	the types are given instead of inferred and the dates are parsed while reading
+	When a date is in several rows, the last one is kept (so the later files have priority)
+	:param paths: the path to the csv file, or the list of paths
+	:param str date_column: the column of the dates
+	:param char sep: the separation character
+	:param bool float32: True to read the values as float32 instead of float64
+	:param dict dtype: the type of some columns, the others are read as floats
+	:param int chunksize: the number of rows read at once, to limit the memory used to parse big files
+	:param str engine: the parser used by pd.read_csv, "pyarrow" is the fastest one when installed (without chunksize)
+		it parses the floats exactly, so the last digit may differ from the default parser
+	:return: the dataframe of the csv files
+	:rtype: pd.DataFrame
+	"""
+	if isinstance(paths, str):
+		paths = [paths]
+	if engine == "pyarrow" and chunksize is not None:
+		raise ValueError("The pyarrow engine can not read a file by chunks")
+	
+	frames = []
+	for path in paths:
+		# Only the header is read to know the columns
+		columns = pd.read_csv(path, sep=sep, nrows=0).columns
+		dtypes = {column: np.float32 if float32 else np.float64 for column in columns if column != date_column}
+		dtypes.update(dtype or {})
+		data = pd.read_csv(path, sep=sep, dtype=dtypes, parse_dates=[date_column],
+		                   index_col=list(columns).index(date_column), chunksize=chunksize, engine=engine)
+		if chunksize is None:
+			frames.append(data)
+		else:
+			with data as chunks:
+				frames.extend(chunk[~chunk.index.duplicated(keep="last")] for chunk in chunks)
+	
+	data = pd.concat(frames, axis=0) if len(frames) > 1 else frames[0]
+	data = data[~data.index.duplicated(keep="last")]
+	if not data.index.is_monotonic_increasing:
+		data = data.sort_index(kind="stable")
+	return data
+
+
 def get_class(df, year) -> pd.DataFrame:
 	"""
 	Get class of the dataFrame depend to class_id and the year
@@ -80,157 +135,527 @@ def get_duplicate(df, on="dataframe", keep=False) -> pd.DataFrame:
 		return df[df[on].duplicated(keep=keep)]
 
 
-def get_specs(df, signal, dates, time_window_length, non_overlapping_length):
+def get_duration(length):
+	"""
+	Get the duration of a window length or of a step
+	:param length: a number of days, or a pandas offset or timedelta ("6h", "30D", ...)
+	:return: the duration
+	:rtype: pd.Timedelta
+	"""
+	if isinstance(length, (int, np.integer)):
+		return pd.Timedelta(days=int(length))
+	return pd.Timedelta(length)
+
+
+def get_windows_firsts(dates, time_window_length, non_overlapping_length, first_window=0):
+	"""
+	Get the first date of each time window
+	:param list dates: The two dates between which the values are taken, the last day being included
+	:param time_window_length: The number of days in one window, or its duration ("6h", "30D", ...)
+	:param non_overlapping_length: The number of days between two windows following each other, or its duration
+	:param int first_window: the number of the first window, the windows before it are skipped
+	:return: firsts, length : the first date of each window and the duration of the windows
+	:rtype: (pd.DatetimeIndex, pd.Timedelta)
+	"""
+	start = parser.parse(dates[0])  # Assuming that date[1] > date[0]
+	end = parser.parse(dates[1])
+	maximum = pd.Timedelta(days=(end - start).days + 1)  # The numbers of days +1 for the last day
+	length = get_duration(time_window_length)
+	step = get_duration(non_overlapping_length)
+	
+	offsets = np.arange(first_window * step.value, (maximum - length).value, step.value)
+	return pd.Timestamp(start) + pd.to_timedelta(offsets, unit="ns"), length
+
+
+@profiled
+def get_windows(df, dates, time_window_length, non_overlapping_length, first_window=0):
+	"""
+	Get the positions of the time windows in the index of the dataframe
+	The index of the dataframe has to be sorted
+	:param pd.DataFrame df: the dataframe used
+	:param list dates: The two dates between which the values are taken
+	:param time_window_length: The number of date in one window, or its duration ("6h", "30D", ...)
+	:param non_overlapping_length: The number of different dates between two window following each other,
+		or its duration
+	:param int first_window: the number of the first window, the windows before it are skipped
+	:return: firsts, lasts, the positions of the first row (included) and of the last row (excluded) of each window
+	:rtype: (np.ndarray, np.ndarray)
+	"""
+	# The same windows as (df.index >= first) & (df.index < last), found once for all the windows
+	firsts, length = get_windows_firsts(dates, time_window_length, non_overlapping_length, first_window)
+	lasts = firsts + length
+	return df.index.searchsorted(firsts, side="left"), df.index.searchsorted(lasts, side="left")
+
+
+def get_period(index):
+	"""
+	Get the time between two rows of a dataframe, the median one so that the missing rows do not change it
+	:param pd.DatetimeIndex index: the dates of the rows
+	:return: the period, one day if there are less than 2 dates
+	:rtype: pd.Timedelta
+	"""
+	steps = index.unique().sort_values().to_series().diff().dropna()
+	if len(steps) == 0:
+		return pd.Timedelta(days=1)
+	return steps.median()
+
+
+def get_gap_windows(df, dates, time_window_length, non_overlapping_length, first_window=0, gaps=None, min_count=None,
+                    period=None):
+	"""
+	Get the time windows once for all the columns and for get_y_data, dealing with the missing rows
+	A row is missing when its date is not in the index or when it has a NaN value
+	:param pd.DataFrame df: the dataframe used
+	:param list dates: The two dates between which the values are taken
+	:param time_window_length: The number of date in one window, or its duration (see get_duration)
+	:param non_overlapping_length: The number of different dates between two window following each other, or its duration
+	:param int first_window: the number of the first window, the windows before it are skipped
+	:param str gaps: what is done with the missing rows :
+		None to keep all the windows, the ones with missing rows being shorter,
+		"skip" to remove the windows with missing rows,
+		"min_count" to remove the windows with less than min_count rows,
+		"interpolate" to interpolate the missing rows in time (the rows before the first value and after the last
+		one are left missing) and keep all the windows, or the ones with at least min_count rows if given
+	:param int min_count: the minimum number of rows of a window
+	:param period: the time between two rows, which gives the number of rows of a full window and the grid of the
+		interpolation, a number of days or a duration ("1h", ...), inferred from the dates of df if None (see get_period)
+	:return: df, windows : the dataframe (interpolated if asked, sorted) and the windows, (numbers, firsts, lasts) :
+		the number of each kept window and the positions of its first row (included) and its last row (excluded),
+		to give to get_specs, get_specs_columns and get_y_data
+	:rtype: (pd.DataFrame, tuple)
+	"""
+	if gaps not in (None, "skip", "min_count", "interpolate"):
+		raise ValueError(f"Unknown gap policy {gaps}, use None, 'skip', 'min_count' or 'interpolate'")
+	if gaps == "min_count" and min_count is None:
+		raise ValueError("The gap policy 'min_count' needs min_count")
+	if not df.index.is_monotonic_increasing:
+		df = df.sort_index(kind="stable")
+	if gaps in ("skip", "interpolate"):
+		period = get_period(df.index) if period is None else get_duration(period)
+		if period <= pd.Timedelta(0):
+			raise ValueError(f"The period {period} is not positive")
+		if period > get_duration(time_window_length):
+			raise ValueError(f"The windows of {time_window_length} are shorter than the period {period} of the rows")
+	
+	if gaps == "interpolate":
+		start = pd.Timestamp(parser.parse(dates[0]))
+		grid = pd.date_range(start, pd.Timestamp(parser.parse(dates[1])) + pd.Timedelta(days=1), freq=period,
+		                     inclusive="left")
+		# The existing rows are kept as they are, only the missing dates are added
+		df = df.reindex(df.index.union(grid)).interpolate(method="time", limit_area="inside")
+	
+	firsts, lasts = get_windows(df, dates, time_window_length, non_overlapping_length, first_window)
+	numbers = np.arange(first_window, first_window + len(firsts))
+	if gaps is None or (gaps == "interpolate" and min_count is None):
+		return df, (numbers, firsts, lasts)
+	
+	# Number of complete rows before each position
+	complete = np.concatenate([[0], np.cumsum(df.notna().all(axis=1).to_numpy())])
+	counts = complete[lasts] - complete[firsts]
+	if gaps == "skip":
+		min_count = int(np.ceil(get_duration(time_window_length) / period))
+	kept = counts >= min_count
+	return df, (numbers[kept], firsts[kept], lasts[kept])
+
+
+def get_windows_view(values, firsts, lasts):
+	"""
+	Get a strided view of the windows, without any copy of the values
+	:param np.ndarray values: the values, the rows are on the last axis
+	:param np.ndarray firsts: the position of the first row of each window
+	:param np.ndarray lasts: the position after the last row of each window
+	:return: windows, positions : the view with the windows on the second to last axis and their rows on the last
+		axis, and None, or when the windows are not evenly spaced (after get_gap_windows for instance) the view of
+		the windows starting at every row and the positions of the kept ones, to give to compute_specs which gathers
+		them block by block instead of copying all of them ; (None, None) if the windows do not all have the same
+		length
+	:rtype: (np.ndarray, np.ndarray)
+	"""
+	if len(firsts) == 0:
+		return None, None
+	lengths = lasts - firsts
+	steps = np.diff(firsts)
+	step = steps[0] if len(steps) else 1
+	if lengths[0] == 0 or np.any(lengths != lengths[0]):
+		return None, None
+	
+	windows = sliding_window_view(values, lengths[0], axis=-1)
+	if np.any(steps != step) or step <= 0:
+		return windows, np.asarray(firsts)
+	return windows[..., firsts[0]:firsts[-1] + 1:step, :], None
+
+
+@profiled
+def get_specs(df, signal, dates, time_window_length, non_overlapping_length, first_window=0, specs=None, dtype=float,
+              out=None, windows=None, min_valid=None):
 	"""
 	Get a dataframe with specifications calculated
 	:param pd.DataFrame df: the dataframe used
 	:param str signal: the column used as a signal
 	:param list dates: The two dates between which the values are taken
-	:param int time_window_length: The number of date in one window
-	:param int non_overlapping_length: The number of different dates between two window following each other
+	:param time_window_length: The number of date in one window, or its duration (see get_duration)
+	:param non_overlapping_length: The number of different dates between two window following each other, or its duration
+	:param int first_window: the number of the first window, the windows before it are skipped
+	:param list specs: the names of the specifications computed, SPECS_LIST if None (see Utils.Specs)
+	:param dtype: the type of the specifications, np.float32 to halve the memory used
+	:param np.ndarray out: the array (or np.memmap) where the specifications are written, one row by window
+	:param tuple windows: the windows given by get_gap_windows with this dataframe, all of them if None
+	:param int min_valid: if given, the NaN values are skipped and the windows with less than min_valid other values
+		get NaN specifications (see compute_specs)
 	:return pd.DataFrame: The dataframe of extracted specifications
 	"""
-	start = parser.parse(dates[0])  # Assuming that date[1] > date[0]
-	end = parser.parse(dates[1])
-	maximum = (end - start).days + 1  # The numbers of days +1 for the last day
-	res_data = []
-	feature_list = []
-	for i in range(0, maximum - time_window_length, non_overlapping_length):
-
-		# Create the mask of dates
-		first = start + datetime.timedelta(i)
-		last = first + datetime.timedelta(time_window_length)
-		mask = (df.index >= first) & (df.index < last)
-
-		# Get a part of the dataframe that matches the mask
-		slice_df = df[signal].loc[mask]
-		
-		# Get the specifications for this part
-		vector_features, feature_list = get_all_specs(slice_df)
-		res_data.append(vector_features)
+	if not df.index.is_monotonic_increasing:
+		df = df.sort_index(kind="stable")
+	if windows is None:
+		firsts, lasts = get_windows(df, dates, time_window_length, non_overlapping_length, first_window)
+	else:
+		_, firsts, lasts = windows
+	series = df[signal]
+	feature_list = SPECS_LIST if specs is None else list(specs)
+	res_data = get_specs_array(out, len(firsts), len(feature_list), dtype)
+	
+	# All the windows are computed at once when they have the same length (and the NaN values are skipped)
+	windows_view, positions = None, None
+	if min_valid is not None or not series.hasnans:
+		windows_view, positions = get_windows_view(series.to_numpy(dtype=float), firsts, lasts)
+	if windows_view is not None:
+		get_all_specs_windows(windows_view, out=res_data, specs=feature_list, min_valid=min_valid, positions=positions)
+	else:
+		# Missing dates or NaN values, each window is computed on its own slice
+		for i, (first, last) in enumerate(zip(firsts, lasts)):
+			res_data[i], _ = get_all_specs(series.iloc[first:last], feature_list, min_valid)
 	
 	res_columns = [f"{feature}_{signal}" for feature in feature_list]
-	return pd.DataFrame(res_data, columns=res_columns)
+	return pd.DataFrame(res_data, columns=res_columns, copy=False)
+
+
+@profiled
+def get_specs_columns(df, dates, time_window_length, non_overlapping_length, columns=None, first_window=0,
+                      specs=None, dtype=float, out=None, windows=None, min_valid=None):
+	"""
+	Get a dataframe with specifications calculated for all the columns at once
+	The columns are in the same order as the concatenation of get_specs for each column
+	:param pd.DataFrame df: the dataframe used
+	:param list dates: The two dates between which the values are taken
+	:param time_window_length: The number of date in one window, or its duration (see get_duration)
+	:param non_overlapping_length: The number of different dates between two window following each other, or its duration
+	:param list columns: the columns used as signals, all the columns of the dataframe (or of specs) if None
+	:param int first_window: the number of the first window, the windows before it are skipped
+	:param specs: the specifications computed, see get_columns_specs
+	:param dtype: the type of the specifications, np.float32 to halve the memory used
+	:param np.ndarray out: the array (or np.memmap, see create_features) where the specifications are written,
+		one row by window and one column by specification, no other array of this size is allocated
+		and the temporary arrays of the windows take around BLOCK_BYTES (see compute_specs) whatever their number
+	:param tuple windows: the windows given by get_gap_windows with this dataframe, all of them if None
+	:param int min_valid: if given, the NaN values are skipped and the windows with less than min_valid other values
+		get NaN specifications (see compute_specs)
+	:return pd.DataFrame: The dataframe of extracted specifications
+	"""
+	if columns is None:
+		columns = list(specs) if isinstance(specs, dict) else list(df.columns)
+	columns_specs = get_columns_specs(columns, specs)
+	if not df.index.is_monotonic_increasing:
+		df = df.sort_index(kind="stable")
+	if windows is None:
+		firsts, lasts = get_windows(df, dates, time_window_length, non_overlapping_length, first_window)
+	else:
+		_, firsts, lasts = windows
+	
+	# The specifications are written directly in the final array : one row by window, signal after signal
+	res_columns = [f"{feature}_{signal}" for signal in columns for feature in columns_specs[signal]]
+	res_data = get_specs_array(out, len(firsts), len(res_columns), dtype)
+	feature_lists = [columns_specs[signal] for signal in columns]
+	
+	# One row by signal, so the rows of each window are contiguous in memory
+	windows_view, positions = None, None
+	if min_valid is not None or not df[columns].isna().values.any():
+		values = np.ascontiguousarray(df[columns].to_numpy(dtype=float).T)
+		windows_view, positions = get_windows_view(values, firsts, lasts)
+	if windows_view is not None and res_data.flags.c_contiguous and \
+		all(feature_list == feature_lists[0] for feature_list in feature_lists):
+		out = res_data.reshape(len(firsts), len(columns), len(feature_lists[0])).transpose(1, 0, 2)
+		get_all_specs_windows(windows_view, out=out, specs=feature_lists[0], min_valid=min_valid, positions=positions)
+	else:
+		# Different specifications for each signal, a column-ordered array, missing dates or NaN values :
+		# computed signal after signal
+		position = 0
+		for i, (signal, feature_list) in enumerate(zip(columns, feature_lists)):
+			res_signal = res_data[:, position:position + len(feature_list)]
+			if windows_view is not None:
+				get_all_specs_windows(windows_view[i], out=res_signal, specs=feature_list, min_valid=min_valid,
+				                      positions=positions)
+			else:
+				get_specs(df, signal, dates, time_window_length, non_overlapping_length, first_window, feature_list,
+				          out=res_signal, windows=(None, firsts, lasts), min_valid=min_valid)
+			position += len(feature_list)
+	
+	return pd.DataFrame(res_data, columns=res_columns, copy=False)
+
+
+def get_specs_array(out, rows, columns, dtype=float):
+	"""
+	Get the array where the specifications are written
+	:param np.ndarray out: the array given by the caller, a new one is created if None
+	:param int rows: the number of windows
+	:param int columns: the number of specifications
+	:param dtype: the type of the new array
+	:return: the array
+	:rtype: np.ndarray
+	"""
+	if out is None:
+		return np.empty((rows, columns), dtype=dtype)
+	if out.shape != (rows, columns):
+		raise ValueError(f"The array of the specifications has the shape {out.shape} instead of {(rows, columns)}")
+	return out
 
 
-def get_specs_min(df):
+def get_columns_specs(columns, specs=None):
+	"""
+	Get the names of the specifications computed for each column
+	:param list columns: the columns used as signals
+	:param specs: None for the specifications of SPECS_LIST, a list of names for the same specifications for all
+		the columns, or a dict {column: list of names} for some specifications for each column (the columns
+		missing from it get no specification)
+	:return: the list of names of the specifications of each column
+	:rtype: dict
+	"""
+	if isinstance(specs, dict):
+		columns_specs = {column: list(specs.get(column, [])) for column in columns}
+	else:
+		columns_specs = {column: list(SPECS_LIST if specs is None else specs) for column in columns}
+	unknown = {name for names in columns_specs.values() for name in names} - set(get_specs_names())
+	if unknown:
+		raise ValueError(f"Unknown specifications {sorted(unknown)}, the known ones are {get_specs_names()}")
+	return columns_specs
+
+
+def get_features_specs(features):
+	"""
+	Get the specifications to compute to get some features, the reverse of the "<specification>_<column>" naming
+	of get_specs_columns
+	:param list features: the names of the features
+	:return: the names of the specifications of each column, to give as specs to get_specs_columns
+	:rtype: dict
+	"""
+	# The longest names first, so that a specification whose name starts with another one is recognized
+	names = sorted(get_specs_names(), key=len, reverse=True)
+	columns_specs = {}
+	for feature in features:
+		name = next((name for name in names if feature.startswith(name + "_")), None)
+		if name is None:
+			raise ValueError(f"The feature {feature} is not named after a known specification {get_specs_names()}")
+		column_specs = columns_specs.setdefault(feature[len(name) + 1:], [])
+		if name not in column_specs:
+			column_specs.append(name)
+	return columns_specs
+
+
+def get_specs_min(df, axis=0):
 	"""
 	Get the min value of the Dataframe
 	:param pd.DataFrame df: the currently used DataFrame
+	:param int axis: the axis along which the value is computed
 	:return: the min value
 	:rtype: float
 	"""
-	return np.min(df, axis=0)
+	return np.min(df, axis=axis)
 
 
-def get_specs_max(df):
+def get_specs_max(df, axis=0):
 	"""
 	Get the max value of the Dataframe
 	:param pd.DataFrame df: the currently used DataFrame
+	:param int axis: the axis along which the value is computed
 	:return: the max value
 	:rtype: float
 	"""
-	return np.max(df, axis=0)
+	return np.max(df, axis=axis)
 
 
-def get_specs_mean(df):
+def get_specs_mean(df, axis=0):
 	"""
 	Get the mean value of the Dataframe
 	:param pd.DataFrame df: the currently used DataFrame
+	:param int axis: the axis along which the value is computed
 	:return: the mean value
 	:rtype: float
 	"""
-	return np.mean(df, axis=0)
+	return np.mean(df, axis=axis)
 
 
-def get_specs_std(df):
+def get_specs_std(df, axis=0):
 	"""
 	Get the std value of the Dataframe
 	:param pd.DataFrame df: the currently used DataFrame
+	:param int axis: the axis along which the value is computed
 	:return: the std value
 	:rtype: float
 	"""
-	return np.std(df, axis=0)
+	return np.std(df, axis=axis)
 
 
-def get_specs_skewness(df):
+def get_specs_skewness(df, axis=0):
 	"""
 	Get the skewness value of the Dataframe
 	:param pd.DataFrame df: the currently used DataFrame
+	:param int axis: the axis along which the value is computed
 	:return: the skewness value
 	:rtype: float
 	"""
-	return stats.skew(df, axis=0)
+	# scipy is slow to import and only needed for the windows with NaN values
+	from scipy import stats
+	return stats.skew(df, axis=axis)
 
 
-def get_specs_kurtosis(df):
+def get_specs_kurtosis(df, axis=0):
 	"""
 	Get the kurtosis value of the Dataframe
 	:param pd.DataFrame df: the currently used DataFrame
+	:param int axis: the axis along which the value is computed
 	:return: the kurtosis value
 	:rtype: float
 	"""
-	return stats.kurtosis(df, axis=0)
+	from scipy import stats
+	return stats.kurtosis(df, axis=axis)
 
 
-def get_specs_variance(df):
+def get_specs_variance(df, axis=0):
 	"""
 	Get the variance value of the Dataframe
 	:param pd.DataFrame df: the currently used DataFrame
+	:param int axis: the axis along which the value is computed
 	:return: the variance value
 	:rtype: float
 	"""
-	return np.var(df, axis=0)
+	return np.var(df, axis=axis)
 
 
-def get_specs_ptp(df):
+def get_specs_ptp(df, axis=0):
 	"""
 	Get the peak-to-peak value of the Dataframe
 	:param pd.DataFrame df: the currently used DataFrame
+	:param int axis: the axis along which the value is computed
 	:return: the peak-to-peak value
 	:rtype: float
 	"""
-	return np.ptp(df, axis=0)
+	return np.ptp(df, axis=axis)
+
+
+# The functions of the specifications of SPECS_LIST, whose results are kept for the windows with NaN values
+SPECS_FUNCTIONS = {"min": get_specs_min, "max": get_specs_max, "mean": get_specs_mean, "std": get_specs_std,
+                   "skewn": get_specs_skewness, "kurt": get_specs_kurtosis, "var": get_specs_variance,
+                   "ptp": get_specs_ptp}
 
 
-def get_all_specs(df):
+@profiled
+def get_all_specs(df, specs=None, min_valid=None):
 	"""
 	Get all specifications and their order
+	The specifications are computed together in a single pass (see compute_specs), except when there are NaN values
+	or no value : the results of pandas, which skips the NaN values for some specifications, are kept in that case,
+	unless min_valid is given
 	:param pd.DataFrame df: the currently used DataFrame
+	:param list specs: the names of the specifications computed, SPECS_LIST if None (see Utils.Specs)
+	:param int min_valid: if given, the NaN values are skipped by all the specifications, which are NaN when there are
+		less than min_valid other values (see compute_specs)
 	:return: specs, the array of all specs and a list of type of specs
 	:rtype: (numpy.array,list)
 	"""
-	specs = get_specs_min(df)
-	specs = np.append(specs, get_specs_max(df))
-	specs = np.append(specs, get_specs_mean(df))
-	specs = np.append(specs, get_specs_std(df))
-	specs = np.append(specs, get_specs_skewness(df))
-	specs = np.append(specs, get_specs_kurtosis(df))
-	specs = np.append(specs, get_specs_variance(df))
-	specs = np.append(specs, get_specs_ptp(df))
-	return specs, ["min", "max", "mean", "std", "skewn", "kurt", "var", "ptp"]
+	feature_list = SPECS_LIST if specs is None else list(specs)
+	values = np.asarray(df, dtype=float)
+	if min_valid is not None:
+		return compute_specs(values.T, feature_list, min_valid=min_valid).T.reshape(-1), feature_list
+	if values.size == 0 or np.isnan(values).any():
+		res = np.array([])
+		for name in feature_list:
+			function = SPECS_FUNCTIONS.get(name)
+			if function is not None:
+				with profile_stage(f"spec.{name}"):
+					res = np.append(res, function(df))
+			elif values.size == 0:
+				res = np.append(res, np.full(values.shape[1:], np.nan))
+			else:
+				res = np.append(res, compute_specs(values.T, [name]))
+		return res, feature_list
+	
+	# Specification after specification, as np.append did with the values of each column
+	return compute_specs(values.T, feature_list).T.reshape(-1), feature_list
 
 
-def get_y_data(dates, time_window_length, non_overlapping_length):
+@profiled
+def get_all_specs_windows(windows, out=None, specs=None, min_valid=None, positions=None):
+	"""
+	Get all specifications of each window, computed together for all the windows (see compute_specs)
+	:param np.ndarray windows: the windows, with their rows on the last axis
+	:param np.ndarray out: the array where the specs are written, the specs being on its last axis
+	:param list specs: the names of the specifications computed, SPECS_LIST if None (see Utils.Specs)
+	:param int min_valid: the minimum number of values which are not NaN, see compute_specs
+	:param np.ndarray positions: the positions of the computed windows, all of them if None (see get_windows_view)
+	:return: specs, the array of all specs (one row by window) and a list of type of specs
+	:rtype: (numpy.array,list)
+	"""
+	feature_list = SPECS_LIST if specs is None else list(specs)
+	return compute_specs(windows, feature_list, out, min_valid, positions), feature_list
+
+
+@profiled
+def get_y_data(dates, time_window_length, non_overlapping_length, first_window=0, seasons=None, hemisphere="north",
+               categorical=False, windows=None):
 	"""
 	Get the season in which the first date is for each time window
 	:param list dates: list of 2 elements : the bounds
-	:param int time_window_length: the length of the window
-	:param int non_overlapping_length: the number of non overlapping element
+	:param time_window_length: the length of the window, a number of days or a duration (see get_duration)
+	:param non_overlapping_length: the number of non overlapping element, or a duration
+	:param int first_window: the number of the first window, the windows before it are skipped
+	:param list seasons: the first day of each season, see get_seasons
+	:param str hemisphere: "north" or "south"
+	:param bool categorical: True to get a pd.Categorical (an int8 code by window) instead of a list of strings
+	:param tuple windows: the windows given by get_gap_windows, to get the seasons of the kept windows only
+		(first_window is then ignored)
 	:return: y_data, the list of seasons
 	:rtype y_data: list
 	"""
-	start = parser.parse(dates[0])  # Assuming that date[1] > date[0]
-	end = parser.parse(dates[1])
-	maximum = (end - start).days + 1  # The numbers of days +1 for the last day
-	y_data = []
-	for i in range(0, maximum - time_window_length, non_overlapping_length):
-		
-		# Get the season of the 'first' date of the time slider window
-		first = start + datetime.timedelta(i)
-		y_data.append(get_season(first.date()))
+	# Get the season of the 'first' date of each time slider window
+	if windows is None:
+		firsts, _ = get_windows_firsts(dates, time_window_length, non_overlapping_length, first_window)
+	else:
+		offsets = np.asarray(windows[0]) * get_duration(non_overlapping_length).value
+		firsts = pd.Timestamp(parser.parse(dates[0])) + pd.to_timedelta(offsets, unit="ns")
+	y_data = get_seasons(firsts, seasons, hemisphere, categorical)
+	return y_data if categorical else y_data.tolist()
+
+
+@profiled
+def get_seasons(dates, seasons=None, hemisphere="north", categorical=False):
+	"""
+	Get the season of all the given dates at once, from a lookup table of the days of the year
+	With the default seasons, the result is the same as get_season for each date
+	:param dates: the dates, a pd.DatetimeIndex or anything it can be created from
+	:param list seasons: list of (season, month, day), the first day of each season,
+		ASTRONOMICAL_SEASONS if None (METEOROLOGICAL_SEASONS are also defined)
+	:param str hemisphere: "north" or "south", the seasons of the southern hemisphere are the opposite ones
+	:param bool categorical: True to get a pd.Categorical, the seasons in the order of the year being its categories
+	:return: the season of each date
+	:rtype: np.ndarray
+	"""
+	if seasons is None:
+		seasons = ASTRONOMICAL_SEASONS
+	if hemisphere not in ("north", "south"):
+		raise ValueError(f"Unknown hemisphere {hemisphere}, it has to be 'north' or 'south'")
+	dates = pd.DatetimeIndex(dates)
 	
-	return y_data
+	# The days are numbered (month - 1) * 31 + day - 1, so that the table is the same for the leap years
+	seasons = sorted(seasons, key=lambda season: (season[1], season[2]))
+	names = [name if hemisphere == "north" else SOUTHERN_SEASONS[name] for name, _, _ in seasons]
+	firsts = np.array([(month - 1) * 31 + day - 1 for _, month, day in seasons])
+	# Before the first season of the year, this is still the last season of the previous year
+	table = np.searchsorted(firsts, np.arange(12 * 31), side="right") - 1
+	days = np.asarray((dates.month - 1) * 31 + dates.day - 1)
+	if categorical:
+		categories = list(dict.fromkeys(names))
+		codes = np.array([categories.index(name) for name in names], dtype=np.int8)
+		return pd.Categorical.from_codes(codes[table][days], categories=categories)
+	return np.asarray(names, dtype=object)[table][days]
 	
 	
 def get_season(target_date):
@@ -130,3 +130,93 @@ def plot_time_slider(df, column_name, dates, block, step, title, time_slider_pat
 			time_slider_path + "/" + f"plot_{column_name}_{(start + datetime.timedelta(i)).strftime('%Y_%m_%d')}--"
 			                         f"{(last - datetime.timedelta(1)).strftime('%Y_%m_%d')}" + ".png")
 		plt.close(fig)
+
+
+def plot_time_slider_parallel(df, column_name, dates, block, step, title, time_slider_path, jobs=None):
+	"""
+	Plot the whole time slider between two dates, the same plots as plot_time_slider, in a pool of processes
+	Each process draws its windows on a single figure, only the data, the title and the x axis change between them
+	:param pd.DataFrame df: the dataframe used
+	:param str column_name: the column used to plot
+	:param list dates: The two dates between which the plot is made
+	:param int block: the number of date in one subplot
+	:param int step: the number of different dates between two subplots following each other
+	:param str title: the title of the plot
+	:param str time_slider_path: The folder where the plots will be saved
+	:param int jobs: the number of processes, the number of CPUs if None
+	"""
+	import datetime
+	import os
+	from concurrent.futures import ProcessPoolExecutor
+	from dateutil import parser
+	from Utils.Get import get_windows
+	
+	if not df.index.is_monotonic_increasing:
+		df = df.sort_index(kind="stable")
+	firsts, lasts = get_windows(df, dates, block, step)
+	start = parser.parse(dates[0])
+	windows = [(start + datetime.timedelta(i), start + datetime.timedelta(i + block), first, last)
+	           for i, first, last in zip(range(0, len(firsts) * step, step), firsts, lasts) if last > first]
+	
+	# Each process gets one window out of jobs, and the data once
+	jobs = os.cpu_count() if jobs is None else jobs
+	chunks = [chunk for chunk in (windows[i::jobs] for i in range(jobs)) if chunk]
+	data = (df.index.values, df[column_name].values, column_name, title, time_slider_path)
+	with ProcessPoolExecutor(max_workers=jobs, initializer=_init_time_slider_worker, initargs=data) as executor:
+		list(executor.map(_plot_time_slider_windows, chunks))
+
+
+# The data of the time slider drawn by a worker
+_time_slider = {}
+
+
+def _init_time_slider_worker(index, values, column_name, title, time_slider_path):
+	"""
+	Keep the data of the time slider in the worker, and draw without any window
+	:param np.ndarray index: the dates
+	:param np.ndarray values: the values of the column
+	:param str column_name: the column used to plot
+	:param str title: the title of the plot
+	:param str time_slider_path: The folder where the plots will be saved
+	"""
+	plt.switch_backend("Agg")
+	_time_slider.update(index=index, values=values, column_name=column_name, title=title, path=time_slider_path)
+
+
+def _plot_time_slider_windows(windows):
+	"""
+	Plot some windows of the time slider on the same figure
+	:param list windows: list of (first date, last date, first position, last position) of each window
+	"""
+	import datetime
+	
+	index, values = _time_slider["index"], _time_slider["values"]
+	fig, ax = plt.subplots(figsize=(20, 10))
+	_, _, first, last = windows[0]
+	line, = ax.plot(index[first:last], values[first:last], 'bo-')
+	
+	# Manage x and y parameters which are the same for all the windows
+	ax.tick_params(axis="x", direction="in", labelrotation=45)
+	ax.xaxis.grid(color="grey", linestyle="dashed")  # vertical lines
+	ax.set_ylim(np.nanmin(values), np.nanmax(values))
+	ax.tick_params(axis="y", direction="inout")
+	ax.grid(axis="y", color="black", alpha=.5, linewidth=.5)
+	ax.yaxis.set_minor_locator(AutoMinorLocator())
+	
+	for first_date, last_date, first, last in windows:
+		daily_ticks = pd.DatetimeIndex(index[first:last])
+		line.set_data(index[first:last], values[first:last])
+		ax.set_title(_time_slider["title"] +
+		             f" between {str(first_date.strftime('%Y-%m-%d'))} and {str(last_date.strftime('%Y-%m-%d'))}",
+		             fontsize=16)
+		
+		# Ticks from 3 to 3 and always the last value
+		ticks = daily_ticks[::3].append(daily_ticks[-1:]).unique()
+		ax.set_xticks(ticks)
+		ax.set_xticklabels([timestamp.strftime('%m-%d') for timestamp in ticks])
+		ax.set_xlim(first_date, last_date)
+		
+		fig.savefig(
+			_time_slider["path"] + "/" + f"plot_{_time_slider['column_name']}_{first_date.strftime('%Y_%m_%d')}--"
+			                             f"{(last_date - datetime.timedelta(1)).strftime('%Y_%m_%d')}" + ".png")
+	plt.close(fig)
@@ -0,0 +1,143 @@
+import atexit
+import cProfile
+import functools
+import json
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# The measures of each stage : wall time, number of calls and memory left allocated
+_stages = {}
+_settings = {"enabled": False, "memory": False, "profiler": None}
+
+
+def enable_profiling(memory=False, profile=False):
+	"""
+	Start measuring the stages of the pipeline (the functions decorated with profiled and the profile_stage blocks)
+	It can also be enabled without changing the code with the environment variables :
+	CLIMATE_PROFILE=1, CLIMATE_PROFILE_MEMORY=1, CLIMATE_PROFILE_OUTPUT=<json file>, CLIMATE_PROFILE_CPROFILE=<file>
+	:param bool memory: True to measure the memory allocated by each stage with tracemalloc (slower)
+	:param bool profile: True to run cProfile too, see disable_profiling to save its results
+	"""
+	_settings["enabled"] = True
+	_settings["memory"] = memory
+	if memory and not tracemalloc.is_tracing():
+		tracemalloc.start()
+	if profile and _settings["profiler"] is None:
+		_settings["profiler"] = cProfile.Profile()
+		_settings["profiler"].enable()
+
+
+def disable_profiling(cprofile_path=None):
+	"""
+	Stop measuring the stages, the measures are kept
+	:param str cprofile_path: the file where the cProfile statistics are saved (readable with pstats)
+	"""
+	_settings["enabled"] = False
+	if _settings["memory"] and tracemalloc.is_tracing():
+		tracemalloc.stop()
+	_settings["memory"] = False
+	profiler = _settings["profiler"]
+	if profiler is not None:
+		profiler.disable()
+		if cprofile_path is not None:
+			profiler.dump_stats(cprofile_path)
+		_settings["profiler"] = None
+
+
+def reset_profiling():
+	"""
+	Remove all the measures
+	"""
+	_stages.clear()
+
+
+@contextmanager
+def profile_stage(name):
+	"""
+	Measure a block of code as a stage
+	:param str name: the name of the stage
+	"""
+	if not _settings["enabled"]:
+		yield
+		return
+
+	memory = _settings["memory"] and tracemalloc.is_tracing()
+	start_memory = tracemalloc.get_traced_memory()[0] if memory else 0
+	start_time = time.perf_counter()
+	try:
+		yield
+	finally:
+		stage = _stages.setdefault(name, {"time": 0.0, "calls": 0, "memory": 0})
+		stage["time"] += time.perf_counter() - start_time
+		stage["calls"] += 1
+		if memory:
+			stage["memory"] += tracemalloc.get_traced_memory()[0] - start_memory
+
+
+def profiled(function):
+	"""
+	Decorator measuring each call of the function as a stage named after it, nothing is done when the profiling
+	is not enabled
+	:param function: the decorated function
+	:return: the decorated function
+	"""
+	name = f"{function.__module__}.{function.__qualname__}"
+
+	@functools.wraps(function)
+	def wrapper(*args, **kwargs):
+		if not _settings["enabled"]:
+			return function(*args, **kwargs)
+		with profile_stage(name):
+			return function(*args, **kwargs)
+
+	return wrapper
+
+
+def get_profiling_report():
+	"""
+	Get the measures of all the stages, the slowest first
+	:return: list of dict with the stage, its total time in seconds, its number of calls,
+		its time by call and the memory it left allocated in bytes
+	:rtype: list
+	"""
+	report = [{"stage": name, "time": stage["time"], "calls": stage["calls"],
+	           "time_by_call": stage["time"] / stage["calls"], "memory": stage["memory"]}
+	          for name, stage in _stages.items()]
+	return sorted(report, key=lambda stage: stage["time"], reverse=True)
+
+
+def print_profiling_report():
+	"""
+	Print the measures of all the stages as a table
+	"""
+	print(f"{'stage':<50} {'time (s)':>12} {'calls':>10} {'by call (s)':>12} {'memory (MiB)':>13}")
+	for stage in get_profiling_report():
+		print(f"{stage['stage']:<50} {stage['time']:>12.6f} {stage['calls']:>10} {stage['time_by_call']:>12.6f} "
+		      f"{stage['memory'] / 2 ** 20:>13.3f}")
+
+
+def save_profiling_report(path):
+	"""
+	Save the measures of all the stages in a JSON file
+	:param str path: the JSON file
+	"""
+	with open(path, "w") as f:
+		json.dump(get_profiling_report(), f, indent=1)
+
+
+def _report_at_exit():
+	"""
+	Print and save the measures when the profiling has been enabled by the environment variables
+	"""
+	disable_profiling(os.environ.get("CLIMATE_PROFILE_CPROFILE"))
+	print_profiling_report()
+	if os.environ.get("CLIMATE_PROFILE_OUTPUT"):
+		save_profiling_report(os.environ["CLIMATE_PROFILE_OUTPUT"])
+
+
+if os.environ.get("CLIMATE_PROFILE", "0") != "0":
+	enable_profiling(memory=os.environ.get("CLIMATE_PROFILE_MEMORY", "0") != "0",
+	                 profile=bool(os.environ.get("CLIMATE_PROFILE_CPROFILE")))
+	atexit.register(_report_at_exit)
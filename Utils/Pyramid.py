@@ -0,0 +1,253 @@
+import numpy as np
+import pandas as pd
+
+from Utils.Get import SPECS_LIST, get_columns_specs, get_duration, get_specs_columns, get_windows_firsts
+from Utils.Profiling import profiled
+
+
+def _reduce_buckets(ufunc, values, firsts, lasts, empty):
+	"""
+	Reduce the consecutive rows of each range at once
+	:param np.ufunc ufunc: the reduction (np.add, np.fmin, np.fmax)
+	:param np.ndarray values: the rows to reduce
+	:param np.ndarray firsts: the position of the first row of each range
+	:param np.ndarray lasts: the position after the last row of each range
+	:param float empty: the result of the empty ranges
+	:return: the reduction of each range
+	:rtype: np.ndarray
+	"""
+	# One extra row so that every position is valid, the odd ranges (between two ranges) are dropped
+	padded = np.concatenate([values, np.full((1,) + values.shape[1:], empty)])
+	res = ufunc.reduceat(padded, np.stack([firsts, lasts], axis=1).reshape(-1), axis=0)[::2]
+	res[lasts <= firsts] = empty
+	return res
+
+
+# The aggregates of a bucket : its number of values, their mean, the sums of the powers 2, 3 and 4 of their
+# deviations from this mean, their min and their max
+AGGREGATES = ["count", "mean", "m2", "m3", "m4", "min", "max"]
+
+
+def _merge(a, b):
+	"""
+	Merge the aggregates of two sets of values, as if they were computed on the union of the values
+	(the pairwise formulas of Chan et al. and Pébay, which do not cancel out when the means are far from each other)
+	:param dict a: the aggregates of the first sets, see AGGREGATES
+	:param dict b: the aggregates of the second sets, the same shape as the first ones
+	:return: the aggregates of the unions
+	:rtype: dict
+	"""
+	n_a, n_b = a["count"], b["count"]
+	n = n_a + n_b
+	# The empty sets have a null mean and null sums, so that they leave the other set as it is
+	safe_n = np.where(n > 0, n, 1)
+	delta = b["mean"] - a["mean"]
+	delta_n = delta / safe_n
+	delta_n2 = delta_n * delta_n
+	term = delta * delta_n * n_a * n_b
+	return {"count": n,
+	        "mean": a["mean"] + delta_n * n_b,
+	        "m2": a["m2"] + b["m2"] + term,
+	        "m3": a["m3"] + b["m3"] + term * delta_n * (n_a - n_b) + 3 * delta_n * (n_a * b["m2"] - n_b * a["m2"]),
+	        "m4": a["m4"] + b["m4"] + term * delta_n2 * (n_a * n_a - n_a * n_b + n_b * n_b) +
+	              6 * delta_n2 * (n_a * n_a * b["m2"] + n_b * n_b * a["m2"]) +
+	              4 * delta_n * (n_a * b["m3"] - n_b * a["m3"]),
+	        "min": np.fmin(a["min"], b["min"]),
+	        "max": np.fmax(a["max"], b["max"])}
+
+
+def _combine(aggregates, firsts, lasts):
+	"""
+	Combine the aggregates of the consecutive rows of each range at once, by merging neighbouring rows two by two
+	until one is left for each range (a pairwise tree, so that the rounding errors grow with the log of the length)
+	:param dict aggregates: the aggregates of the rows, see AGGREGATES
+	:param np.ndarray firsts: the position of the first row of each range
+	:param np.ndarray lasts: the position after the last row of each range
+	:return: the aggregates of each range, the empty ones having no value
+	:rtype: dict
+	"""
+	lengths = np.maximum(np.asarray(lasts) - np.asarray(firsts), 0)
+	ends = np.cumsum(lengths)
+	# The rows of all the ranges one after the other (the rows of overlapping ranges are repeated)
+	rows = np.arange(ends[-1] if len(ends) else 0) - np.repeat(ends - lengths - np.asarray(firsts), lengths)
+	items = {name: values[rows] for name, values in aggregates.items()}
+	sizes = lengths
+	while len(sizes) and sizes.max() > 1:
+		starts = np.cumsum(sizes) - sizes
+		local = np.arange(len(items["count"])) - np.repeat(starts, sizes)
+		kept = np.flatnonzero(local % 2 == 0)
+		paired = kept[local[kept] + 1 < np.repeat(sizes, sizes)[kept]]
+		merged = _merge({name: values[paired] for name, values in items.items()},
+		                {name: values[paired + 1] for name, values in items.items()})
+		for name, values in items.items():
+			values[paired] = merged[name]
+		items = {name: values[kept] for name, values in items.items()}
+		sizes = (sizes + 1) // 2
+
+	shape = (len(lengths),) + next(iter(aggregates.values())).shape[1:]
+	res = {name: np.full(shape, np.nan if name in ("min", "max") else 0.0) for name in AGGREGATES}
+	for name in AGGREGATES:
+		res[name][lengths > 0] = items[name]
+	return res
+
+
+class AggregationPyramid:
+	"""
+	Partial aggregates of a dataframe over buckets of increasing durations (for instance minute -> hour -> day) :
+	the number of values, their mean, the sums of the powers of their deviations from this mean (see AGGREGATES),
+	their min and their max. Each level is computed from the previous one, and the windows whose bounds fall on
+	the buckets of a level are computed by merging the aggregates of their buckets instead of the raw rows
+	(see _merge), so that one dataset serves many window configurations.
+	Only the specifications of SPECS_LIST can be combined, and the NaN values are skipped, so a dataframe with NaN
+	values is only combined with min_valid (else a NaN value gives NaN specifications, see get_specs).
+	The results are the ones of get_specs_columns up to the rounding of the deviations from the means : within
+	1e-9 relative for min, max, mean, std, var and ptp, and 1e-9 absolute for skewn and kurt (which cancel out when
+	they are close to 0, so their relative difference is larger), plus 10 * eps * |mean| / std for the windows whose
+	variance is tiny compared to their mean (where the rows themselves lose this precision)
+	"""
+
+	def __init__(self, df, levels=("1h", "1D")):
+		"""
+		Compute the aggregates of each level
+		:param pd.DataFrame df: the dataframe, indexed by date
+		:param list levels: the durations of the buckets (pandas offsets or timedeltas), each one a multiple of the
+			previous one
+		"""
+		if not df.index.is_monotonic_increasing:
+			df = df.sort_index(kind="stable")
+		self.df = df
+		self.columns = list(df.columns)
+		values = df.to_numpy(dtype=float)
+		self.nans = np.isnan(values).any(axis=0)
+
+		self.levels = {}
+		index, aggregates = df.index, None
+		for duration in sorted(get_duration(level) for level in levels):
+			if aggregates is None:
+				index, aggregates = self._aggregate_rows(index, values, duration)
+			else:
+				index, aggregates = self._aggregate(index, aggregates, duration)
+			self.levels[duration] = index, aggregates
+
+	@staticmethod
+	def _get_buckets(index, duration):
+		"""
+		Get the rows (or buckets) of each bucket of a level
+		:param pd.DatetimeIndex index: the date of each row, sorted
+		:param pd.Timedelta duration: the duration of the buckets
+		:return: the first date of each bucket, the position of its first row and the position after its last row
+		:rtype: (pd.DatetimeIndex, np.ndarray, np.ndarray)
+		"""
+		keys = index.floor(duration)
+		starts = np.flatnonzero(np.concatenate([[True], keys[1:] != keys[:-1]])) if len(keys) else np.array([], int)
+		return keys[starts], starts, np.append(starts[1:], len(keys))
+
+	@staticmethod
+	def _aggregate_rows(index, values, duration):
+		"""
+		Compute the aggregates of the first level from the rows, in two passes : the mean of each bucket, then the
+		sums of the powers of the deviations from it
+		:param pd.DatetimeIndex index: the date of each row, sorted
+		:param np.ndarray values: the values, one row by date, NaN values being skipped
+		:param pd.Timedelta duration: the duration of the buckets
+		:return: index, aggregates : the first date of each bucket and its aggregates
+		:rtype: (pd.DatetimeIndex, dict)
+		"""
+		keys, starts, ends = AggregationPyramid._get_buckets(index, duration)
+		valid = ~np.isnan(values)
+		count = _reduce_buckets(np.add, valid.astype(float), starts, ends, 0.0)
+		with np.errstate(all="ignore"):
+			mean = np.nan_to_num(_reduce_buckets(np.add, np.where(valid, values, 0), starts, ends, 0.0) / count)
+		deviations = np.where(valid, values - np.repeat(mean, ends - starts, axis=0), 0)
+		squared_deviations = deviations * deviations
+		return keys, {"count": count, "mean": mean,
+		              "m2": _reduce_buckets(np.add, squared_deviations, starts, ends, 0.0),
+		              "m3": _reduce_buckets(np.add, squared_deviations * deviations, starts, ends, 0.0),
+		              "m4": _reduce_buckets(np.add, squared_deviations * squared_deviations, starts, ends, 0.0),
+		              "min": _reduce_buckets(np.fmin, values, starts, ends, np.nan),
+		              "max": _reduce_buckets(np.fmax, values, starts, ends, np.nan)}
+
+	@staticmethod
+	def _aggregate(index, aggregates, duration):
+		"""
+		Combine the aggregates of the rows (or buckets) of the same bucket of a level
+		:param pd.DatetimeIndex index: the date of each row, sorted
+		:param dict aggregates: the arrays of aggregates, one row by date
+		:param pd.Timedelta duration: the duration of the buckets
+		:return: index, aggregates : the first date of each bucket and its aggregates
+		:rtype: (pd.DatetimeIndex, dict)
+		"""
+		keys, starts, ends = AggregationPyramid._get_buckets(index, duration)
+		return keys, _combine(aggregates, starts, ends)
+
+	def get_level(self, firsts, length):
+		"""
+		Get the coarsest level whose buckets contain the windows exactly
+		:param pd.DatetimeIndex firsts: the first date of each window
+		:param pd.Timedelta length: the duration of the windows
+		:return: the duration of the buckets of the level, None if no level fits
+		:rtype: pd.Timedelta
+		"""
+		for duration in sorted(self.levels, reverse=True):
+			if length % duration == pd.Timedelta(0) and (firsts == firsts.floor(duration)).all():
+				return duration
+		return None
+
+	@profiled
+	def get_specs(self, dates, time_window_length, non_overlapping_length, columns=None, first_window=0, specs=None,
+	              dtype=float, min_valid=None):
+		"""
+		Get a dataframe with specifications calculated for all the columns, as get_specs_columns does,
+		from the aggregates of the coarsest level which fits the windows (from the rows if none fits)
+		:param list dates: The two dates between which the values are taken
+		:param time_window_length: The number of days in one window, or its duration (see get_duration)
+		:param non_overlapping_length: The number of days between two windows following each other, or its duration
+		:param list columns: the columns used as signals, all the columns of the dataframe (or of specs) if None
+		:param int first_window: the number of the first window, the windows before it are skipped
+		:param specs: the specifications computed, see get_columns_specs
+		:param dtype: the type of the specifications
+		:param int min_valid: the minimum number of values of a window which are not NaN, below which its
+			specifications are NaN (see compute_specs), the windows being computed from the rows if None and the
+			columns have NaN values
+		:return pd.DataFrame: The dataframe of extracted specifications
+		"""
+		if columns is None:
+			columns = list(specs) if isinstance(specs, dict) else self.columns
+		columns_specs = get_columns_specs(columns, specs)
+		firsts, length = get_windows_firsts(dates, time_window_length, non_overlapping_length, first_window)
+		level = self.get_level(firsts, length)
+		positions = [self.columns.index(column) for column in columns]
+		if level is None or any(name not in SPECS_LIST for names in columns_specs.values() for name in names) or \
+			(min_valid is None and self.nans[positions].any()):
+			return get_specs_columns(self.df, dates, time_window_length, non_overlapping_length, columns, first_window,
+			                         specs, dtype, min_valid=min_valid)
+
+		index, aggregates = self.levels[level]
+		lows = index.searchsorted(firsts, side="left")
+		highs = index.searchsorted(firsts + length, side="left")
+		window = _combine({name: values[:, positions] for name, values in aggregates.items()}, lows, highs)
+
+		# Moments of each window from the sums of the powers of the deviations
+		with np.errstate(all="ignore"):
+			count = np.where(window["count"] >= max(min_valid or 1, 1), window["count"], np.nan)
+			mean = np.where(np.isnan(count), np.nan, window["mean"])
+			m2 = window["m2"] / count
+			m3 = window["m3"] / count
+			m4 = window["m4"] / count
+			# Same test as Moments for the windows whose values are (nearly) all the same
+			constant = (window["max"] == window["min"]) | (m2 <= (np.finfo(float).eps * mean) ** 2)
+			minimum = np.where(np.isnan(count), np.nan, window["min"])
+			maximum = np.where(np.isnan(count), np.nan, window["max"])
+			stats = {"min": minimum, "max": maximum, "mean": mean, "std": np.sqrt(m2),
+			         "skewn": np.where(constant, np.nan, m3 / m2 ** 1.5),
+			         "kurt": np.where(constant, np.nan, m4 / m2 ** 2.0) - 3,
+			         "var": m2, "ptp": maximum - minimum}
+
+		res_columns = [f"{feature}_{signal}" for signal in columns for feature in columns_specs[signal]]
+		res_data = np.empty((len(firsts), len(res_columns)), dtype=dtype)
+		position = 0
+		for i, signal in enumerate(columns):
+			for feature in columns_specs[signal]:
+				res_data[:, position] = stats[feature][:, i]
+				position += 1
+		return pd.DataFrame(res_data, columns=res_columns, copy=False)
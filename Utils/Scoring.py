@@ -0,0 +1,78 @@
+import argparse
+import json
+import os
+
+from Utils.Get import get_dataset, get_specs_columns, get_y_data
+from Utils.Profiling import profiled
+from Utils.Store import save_features
+
+
+def load_selection(report_path):
+	"""
+	Load a selection saved by save_selection
+	:param str report_path: the report of the selection
+	:return: the report : the selected features ("selected"), their importances, the parameters of the windows
+		("window") and the specifications to compute for each column ("specs")
+	:rtype: dict
+	"""
+	with open(report_path) as f:
+		report = json.load(f)
+	if "specs" not in report:
+		raise ValueError(f"{report_path} does not have the specifications of its selection, "
+		                 f"run the dimensionality reduction again to save them")
+	return report
+
+
+@profiled
+def score_features(df, selection, dates=None, time_window_length=None, non_overlapping_length=None, dtype=float,
+                   labels=False):
+	"""
+	Get the selected features of new data : only the (specification, column) pairs of the selection are computed
+	:param pd.DataFrame df: the new data, indexed by date
+	:param selection: the report of the selection (see load_selection), or its path
+	:param list dates: the two dates between which the values are taken, the first and the last date of df if None
+	:param time_window_length: the length of the windows, the one of the selection if None
+	:param non_overlapping_length: the number of days between two windows, the one of the selection if None
+	:param dtype: the type of the features
+	:param bool labels: True to get the season of each window as well
+	:return: the features, in the order of the selection, and the seasons if labels
+	:rtype: pd.DataFrame or (pd.DataFrame, list)
+	"""
+	if isinstance(selection, str):
+		selection = load_selection(selection)
+	window = selection.get("window", {})
+	if dates is None:
+		dates = [str(df.index.min()), str(df.index.max())]
+	if time_window_length is None:
+		time_window_length = window.get("time_window_length")
+	if non_overlapping_length is None:
+		non_overlapping_length = window.get("non_overlapping_length")
+	if time_window_length is None or non_overlapping_length is None:
+		raise ValueError("The selection does not have the parameters of its windows, give them")
+
+	missing = [column for column in selection["specs"] if column not in df.columns]
+	if missing:
+		raise ValueError(f"The columns {missing} of the selection are not in the data")
+	x = get_specs_columns(df, dates, time_window_length, non_overlapping_length, specs=selection["specs"], dtype=dtype)
+	# The features are computed column after column, they are given back in the order of the selection
+	x = x[selection["selected"]]
+	if labels:
+		return x, get_y_data(dates, time_window_length, non_overlapping_length)
+	return x
+
+
+if __name__ == '__main__':
+	argument_parser = argparse.ArgumentParser(description="Compute the features of a saved selection on new data",
+	                                          epilog="Run from the root of the repository : "
+	                                                 "python -m Utils.Scoring report files ... --output file")
+	argument_parser.add_argument("report", help="the report of the selection, saved by the dimensionality reduction")
+	argument_parser.add_argument("files", nargs="+", help="the csv files of the new data")
+	argument_parser.add_argument("--output", required=True, help="the file where the features are saved")
+	argument_parser.add_argument("--dates", nargs=2, default=None, help="the first and the last date")
+	argument_parser.add_argument("--date-column", default="date")
+	argument_parser.add_argument("--sep", default=",")
+	arguments = argument_parser.parse_args()
+
+	os.makedirs(os.path.dirname(arguments.output) or ".", exist_ok=True)
+	new_df = get_dataset(arguments.files, date_column=arguments.date_column, sep=arguments.sep)
+	save_features(arguments.output, *score_features(new_df, arguments.report, arguments.dates, labels=True))
@@ -0,0 +1,403 @@
+import argparse
+import asyncio
+import csv
+import datetime
+import glob
+import os
+import signal
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from Utils.Get import get_seasons
+from Utils.Store import get_format, get_metadata_path, load_features, load_metadata, save_features
+from Utils.Streaming import StreamingSpecs
+
+
+class BatchWriter:
+	"""
+	Output store of the ingestion service : each batch of windows is saved by save_features as a new part of a folder,
+	so that nothing already written is read or rewritten
+	"""
+
+	def __init__(self, path, extension=".parquet"):
+		"""
+		Initialize the store
+		:param str path: the folder of the parts
+		:param str extension: the extension of the parts, which gives their format (see save_features)
+		"""
+		self.path = path
+		self.extension = extension
+		os.makedirs(path, exist_ok=True)
+		self.parts = len(get_parts(path))
+
+	def __call__(self, df_specs, y_data):
+		"""
+		Save a batch of windows
+		:param pd.DataFrame df_specs: the specifications, indexed by (station, first date of the window)
+		:param list y_data: the season of each window
+		:return: the path of the part
+		:rtype: str
+		"""
+		part_path = os.path.join(self.path, f"part-{self.parts:06d}{self.extension}")
+		self.parts += 1
+		# The index is only kept by the pickle files, it is saved in the metadata to restore it
+		save_features(part_path, df_specs, y_data,
+		              {"stations": df_specs.index.get_level_values(0).tolist(),
+		               "firsts": [str(first) for first in df_specs.index.get_level_values(1)]})
+		return part_path
+
+
+def get_parts(path):
+	"""
+	Get the parts saved by a BatchWriter
+	:param str path: the folder of the parts
+	:return: the paths of the parts, in the order they were written
+	:rtype: list
+	"""
+	parts = sorted(glob.glob(os.path.join(path, "part-*")))
+	# The metadata of the pickle parts are saved next to them (see save_features)
+	return [part for part in parts if get_metadata_path(os.path.splitext(part)[0]) != part]
+
+
+def load_batches(path, columns=None):
+	"""
+	Load all the windows saved by a BatchWriter
+	:param str path: the folder of the parts
+	:param list columns: the specifications to load, all of them if None
+	:return: df_specs, y_data : the specifications indexed by (station, first date of the window) and their seasons
+	:rtype: (pd.DataFrame, list)
+	"""
+	frames, y_data = [], []
+	for part_path in get_parts(path):
+		df_part, y_part = load_features(part_path, columns=columns)
+		if get_format(part_path) != "pickle":
+			metadata = load_metadata(part_path)
+			df_part.index = pd.MultiIndex.from_arrays([metadata["stations"], pd.DatetimeIndex(metadata["firsts"])],
+			                                          names=["station", "first"])
+		frames.append(df_part)
+		y_data.extend(y_part)
+	if not frames:
+		return pd.DataFrame(columns=columns), y_data
+	return pd.concat(frames), y_data
+
+
+class IngestionService:
+	"""
+	Computation of the specifications of the windows of many stations from records arriving continuously, in one
+	process : each station has its own StreamingSpecs, fed in a single asyncio task as the records of all the sources
+	arrive, and the completed windows are written by batches with their seasons.
+	The records wait in a bounded queue, so the sources are paused when the computation or the writes can not keep up
+	"""
+
+	def __init__(self, columns, time_window_length, non_overlapping_length, writer, start=None,
+	             period=datetime.timedelta(1), batch_size=1024, max_pending=10000, flush_interval=1.0, seasons=None,
+	             hemisphere="north"):
+		"""
+		Initialize the service
+		:param list columns: the names of the signals of each record
+		:param time_window_length: the number of days in one window, or its duration (see get_duration)
+		:param non_overlapping_length: the number of days between two windows, or its duration
+		:param writer: the function saving a batch of windows, called with (df_specs, y_data), see BatchWriter
+		:param start: the date of the first window of all the stations, the date of the first record of each station
+			if None
+		:param datetime.timedelta period: the time between two records of a station (see StreamingSpecs)
+		:param int batch_size: the number of windows written at once
+		:param int max_pending: the number of records waiting to be processed before the sources are paused
+		:param float flush_interval: the number of seconds after which the windows are written even if the batch is
+			not full
+		:param list seasons: the first day of each season, see get_seasons
+		:param str hemisphere: "north" or "south"
+		"""
+		self.columns = list(columns)
+		self.time_window_length = time_window_length
+		self.non_overlapping_length = non_overlapping_length
+		self.writer = writer
+		self.start = start
+		self.period = period
+		self.batch_size = batch_size
+		self.max_pending = max_pending
+		self.flush_interval = flush_interval
+		self.seasons = seasons
+		self.hemisphere = hemisphere
+
+		self.stations = {}
+		self.windows = 0
+		self.rejected = 0
+		self._queue = None
+		self._pending = []
+		# One thread, so that the batches are written in order without blocking the event loop
+		self._executor = ThreadPoolExecutor(max_workers=1)
+
+	def get_station(self, station, date):
+		"""
+		Get the state of the windows of a station, created with its first record
+		:param str station: the name of the station
+		:param pd.Timestamp date: the date of the record
+		:return: the state of the station
+		:rtype: StreamingSpecs
+		"""
+		if station not in self.stations:
+			self.stations[station] = StreamingSpecs(date if self.start is None else self.start,
+			                                        self.time_window_length, self.non_overlapping_length,
+			                                        self.columns, self.period)
+		return self.stations[station]
+
+	async def put(self, station, date, values):
+		"""
+		Add a record, waiting while the queue is full
+		:param str station: the name of the station
+		:param date: the date of the record
+		:param values: the value of each signal, in the order of the columns
+		"""
+		await self._queue.put((station, date, values))
+
+	async def feed(self, source):
+		"""
+		Add all the records of a source
+		:param source: an asynchronous iterator of (station, date, values), see follow_csv, read_lines and read_queue
+		"""
+		async for station, date, values in source:
+			await self.put(station, date, values)
+
+	async def run(self, sources):
+		"""
+		Process the records of the sources until all of them are exhausted, then write the last windows
+		If a source fails or the service is cancelled, the records already queued are still processed and the
+		completed windows written before the error is raised
+		:param list sources: the asynchronous iterators of (station, date, values)
+		:return: the number of windows written
+		:rtype: int
+		"""
+		self._queue = asyncio.Queue(maxsize=self.max_pending)
+		consumer = asyncio.create_task(self._consume())
+		feeding = asyncio.gather(*(self.feed(source) for source in sources))
+		try:
+			# The sources are stopped if the consumer fails, else they would wait for it forever
+			await asyncio.wait([feeding, consumer], return_when=asyncio.FIRST_COMPLETED)
+			if consumer.done():
+				consumer.result()
+			await feeding
+			await self._queue.put(None)
+			await consumer
+		except BaseException:
+			feeding.cancel()
+			# The error of the sources is the one raised below, it is only retrieved here
+			await asyncio.gather(feeding, return_exceptions=True)
+			if not consumer.done():
+				await self._queue.put(None)
+				await consumer
+			else:
+				# The consumer failed, the windows it completed before are written
+				await self.flush()
+			raise
+		finally:
+			feeding.cancel()
+			consumer.cancel()
+		return self.windows
+
+	async def _consume(self):
+		"""
+		Process the records of the queue until None, writing the completed windows by batches
+		"""
+		loop = asyncio.get_running_loop()
+		deadline = loop.time() + self.flush_interval
+		while True:
+			try:
+				record = await asyncio.wait_for(self._queue.get(), max(deadline - loop.time(), 0))
+			except asyncio.TimeoutError:
+				record = ()
+			if record is None:
+				break
+			if record:
+				station, date, values = record
+				date = pd.Timestamp(date)
+				try:
+					completed = self.get_station(station, date).push(date, values)
+				except ValueError:
+					# A record older than the previous one of its station can not be added to its windows
+					self.rejected += 1
+					completed = []
+				self._pending.extend((station, first, specs) for first, specs in completed)
+			if len(self._pending) >= self.batch_size or loop.time() >= deadline:
+				await self.flush()
+				deadline = loop.time() + self.flush_interval
+		await self.flush()
+
+	async def flush(self):
+		"""
+		Write the completed windows which are not written yet, the records waiting meanwhile
+		"""
+		if not self._pending:
+			return
+		pending, self._pending = self._pending, []
+		firsts = pd.DatetimeIndex([first for _, first, _ in pending])
+		df_specs = pd.DataFrame(np.array([specs for _, _, specs in pending]),
+		                        columns=next(iter(self.stations.values())).specs_columns,
+		                        index=pd.MultiIndex.from_arrays([[station for station, _, _ in pending], firsts],
+		                                                        names=["station", "first"]))
+		y_data = get_seasons(firsts, self.seasons, self.hemisphere).tolist()
+		await asyncio.get_running_loop().run_in_executor(self._executor, self.writer, df_specs, y_data)
+		self.windows += len(pending)
+
+
+def get_record_parser(header, columns, station=None, station_column="station", date_column="date"):
+	"""
+	Get the function turning a row of a csv source into a record
+	:param list header: the columns of the rows
+	:param list columns: the signals of the records, in their order
+	:param str station: the station of all the rows, read in station_column if None
+	:param str station_column: the column of the stations
+	:param str date_column: the column of the dates
+	:return: the function giving (station, date, values) from the list of the fields of a row
+	:rtype: function
+	"""
+	positions = [header.index(column) for column in columns]
+	date_position = header.index(date_column)
+	station_position = None if station is not None else header.index(station_column)
+
+	def parse(fields):
+		values = [float(fields[position]) if fields[position] != "" else np.nan for position in positions]
+		return (station if station_position is None else fields[station_position]), fields[date_position], values
+	return parse
+
+
+async def follow_csv(path, columns, station=None, station_column="station", date_column="date", sep=',',
+                     interval=1.0, stop=None):
+	"""
+	Read the rows of a csv file as records, then the rows appended to it, as "tail -f" does
+	:param str path: the csv file, with a header
+	:param list columns: the signals of the records, in their order
+	:param str station: the station of all the rows, the name of the file if None and station_column is None,
+		else read in station_column
+	:param str station_column: the column of the stations
+	:param str date_column: the column of the dates
+	:param char sep: the separation character
+	:param float interval: the number of seconds between two checks of the end of the file
+	:param asyncio.Event stop: the end of the reading once the end of the file is reached, the file is only read
+		once if None
+	:return: the asynchronous iterator of (station, date, values)
+	"""
+	if station is None and station_column is None:
+		station = os.path.splitext(os.path.basename(path))[0]
+	with open(path, newline="") as f:
+		parse = None
+		line = ""
+		while True:
+			line += f.readline()
+			if not line.endswith("\n"):
+				# End of the file, the last line may still be partially written
+				if stop is None or stop.is_set():
+					if line and parse is not None:
+						yield parse(next(csv.reader([line], delimiter=sep)))
+					return
+				await asyncio.sleep(interval)
+				continue
+			fields = next(csv.reader([line], delimiter=sep), None)
+			line = ""
+			if not fields:
+				continue
+			if parse is None:
+				parse = get_record_parser(fields, columns, station, station_column, date_column)
+			else:
+				yield parse(fields)
+
+
+async def read_lines(reader, columns, header=None, station=None, station_column="station", date_column="date",
+                     sep=','):
+	"""
+	Read the csv rows of a stream (a socket for instance) as records, until its end
+	:param asyncio.StreamReader reader: the stream
+	:param list columns: the signals of the records, in their order
+	:param list header: the columns of the rows, given by the first line if None
+	:param str station: the station of all the rows, read in station_column if None
+	:param str station_column: the column of the stations
+	:param str date_column: the column of the dates
+	:param char sep: the separation character
+	:return: the asynchronous iterator of (station, date, values)
+	"""
+	parse = None if header is None else get_record_parser(header, columns, station, station_column, date_column)
+	async for line in reader:
+		fields = next(csv.reader([line.decode()], delimiter=sep), None)
+		if not fields:
+			continue
+		if parse is None:
+			parse = get_record_parser(fields, columns, station, station_column, date_column)
+		else:
+			yield parse(fields)
+
+
+async def open_socket(host, port, columns, **kwargs):
+	"""
+	Read the csv rows sent by a server as records, until the connection is closed
+	:param str host: the host of the server
+	:param int port: the port of the server
+	:param list columns: the signals of the records, in their order
+	:param kwargs: the other parameters of read_lines
+	:return: the asynchronous iterator of (station, date, values)
+	"""
+	reader, writer = await asyncio.open_connection(host, port)
+	try:
+		async for record in read_lines(reader, columns, **kwargs):
+			yield record
+	finally:
+		writer.close()
+
+
+async def read_queue(queue):
+	"""
+	Read the records put in a queue, a local stand-in for the other sources, until None is put
+	:param asyncio.Queue queue: the queue of (station, date, values)
+	:return: the asynchronous iterator of (station, date, values)
+	"""
+	while True:
+		record = await queue.get()
+		if record is None:
+			return
+		yield record
+
+
+if __name__ == '__main__':
+	argument_parser = argparse.ArgumentParser(description="Compute the features of csv files as their rows arrive, "
+	                                                      "one station by file unless --station-column is given",
+	                                          epilog="Run from the root of the repository : "
+	                                                 "python -m Utils.Service files ... --output folder --columns ...")
+	argument_parser.add_argument("files", nargs="+", help="the csv files")
+	argument_parser.add_argument("--output", required=True, help="the folder where the windows are written")
+	argument_parser.add_argument("--columns", nargs="+", required=True, help="the signals")
+	argument_parser.add_argument("--window", nargs=2, default=["30", "7"],
+	                             metavar=("TIME_WINDOW_LENGTH", "NON_OVERLAPPING_LENGTH"),
+	                             help="the window, in days or as durations (6h 1h)")
+	argument_parser.add_argument("--period", default="1D", help="the time between two rows of a station")
+	argument_parser.add_argument("--station-column", default=None)
+	argument_parser.add_argument("--date-column", default="date")
+	argument_parser.add_argument("--sep", default=",")
+	argument_parser.add_argument("--format", choices=["pkl", "parquet", "npy"], default="parquet")
+	argument_parser.add_argument("--batch-size", type=int, default=1024)
+	argument_parser.add_argument("--follow", action="store_true", help="wait for the rows appended to the files")
+	arguments = argument_parser.parse_args()
+
+	service = IngestionService(arguments.columns, *[int(value) if value.isdigit() else value
+	                                                for value in arguments.window],
+	                           BatchWriter(arguments.output, {"pkl": ".pkl", "parquet": ".parquet",
+	                                                          "npy": ""}[arguments.format]),
+	                           period=pd.Timedelta(arguments.period), batch_size=arguments.batch_size)
+
+	async def serve():
+		# Without --follow the files are only read once, with it they are followed until SIGINT or SIGTERM : the files
+		# are then read to their end and the last windows are written
+		stop = asyncio.Event() if arguments.follow else None
+		if stop is not None:
+			for signal_number in (signal.SIGINT, signal.SIGTERM):
+				try:
+					asyncio.get_running_loop().add_signal_handler(signal_number, stop.set)
+				except NotImplementedError:
+					# No signal handlers in the event loops of Windows, an interruption cancels the service
+					pass
+		windows = await service.run([follow_csv(path, arguments.columns, station_column=arguments.station_column,
+		                                        date_column=arguments.date_column, sep=arguments.sep, stop=stop)
+		                             for path in arguments.files])
+		print(f"{windows} windows of {len(service.stations)} stations, {service.rejected} records rejected")
+
+	asyncio.run(serve())
@@ -0,0 +1,272 @@
+import numpy as np
+
+from Utils.Kernels import compute_moments
+from Utils.Profiling import profile_stage
+
+SPECS_LIST = ["min", "max", "mean", "std", "skewn", "kurt", "var", "ptp"]
+# The robust specifications : the values further than CLIP_THRESHOLD scaled MADs from the median are clipped,
+# the MAD being scaled by MAD_SCALE to estimate the standard deviation of normally distributed values
+ROBUST_SPECS_LIST = ["median", "mad", "clipped_mean", "clipped_std", "clipped_skewn", "clipped_kurt"]
+CLIP_THRESHOLD = 3.0
+MAD_SCALE = 1.4826
+# The size of the windows computed at once by compute_specs, in bytes of temporary arrays : each value of a block is
+# in around TEMPORARY_ARRAYS float64 arrays at once (the deviations, their squares, their products and a sorted copy)
+BLOCK_BYTES = 2 ** 25
+TEMPORARY_ARRAYS = 4
+
+
+class Moments:
+	"""
+	Statistics of a batch of windows (their rows on the last axis), each one computed once and only when a
+	specification needs it, so that all the specifications share the same pass over the windows :
+	the deviations from the mean give m2, m3 and m4 together, min and max are reused by ptp, ...
+	"""
+
+	def __init__(self, windows, statistics=None):
+		"""
+		Initialize the statistics of the windows
+		:param np.ndarray windows: the windows, with their rows on the last axis
+		:param dict statistics: statistics already computed (see compute_moments), by name
+		"""
+		self.windows = windows
+		self.count = windows.shape[-1]
+		self._cache = dict(statistics or {})
+
+	def _get(self, name, function):
+		"""
+		Get a statistic, computed the first time only
+		:param str name: the name of the statistic
+		:param function: the function computing it
+		:return: the statistic of each window
+		:rtype: np.ndarray
+		"""
+		if name not in self._cache:
+			self._cache[name] = function()
+		return self._cache[name]
+
+	@property
+	def min(self):
+		return self._get("min", lambda: np.min(self.windows, axis=-1))
+
+	@property
+	def max(self):
+		return self._get("max", lambda: np.max(self.windows, axis=-1))
+
+	@property
+	def mean(self):
+		return self._get("mean", lambda: np.sum(self.windows, axis=-1) / self.count)
+
+	@property
+	def deviations(self):
+		return self._get("deviations", lambda: self.windows - self.mean[..., np.newaxis])
+
+	@property
+	def squared_deviations(self):
+		return self._get("squared_deviations", lambda: self.deviations * self.deviations)
+
+	@property
+	def m2(self):
+		return self._get("m2", lambda: np.sum(self.squared_deviations, axis=-1) / self.count)
+
+	@property
+	def m3(self):
+		return self._get("m3", lambda: np.sum(self.squared_deviations * self.deviations, axis=-1) / self.count)
+
+	@property
+	def m4(self):
+		return self._get("m4", lambda: np.sum(self.squared_deviations * self.squared_deviations, axis=-1) / self.count)
+
+	@property
+	def constant(self):
+		# Same test as scipy.stats for the windows whose values are (nearly) all the same
+		return self._get("constant", lambda: self.m2 <= (np.finfo(self.m2.dtype).eps * self.mean) ** 2)
+
+	@property
+	def sorted(self):
+		return self._get("sorted", lambda: np.sort(self.windows, axis=-1))
+
+	def quantile(self, q):
+		return self._get(f"quantile{q}", lambda: np.quantile(self.sorted, q, axis=-1))
+
+	@property
+	def mad(self):
+		# Median of the absolute deviations from the median
+		return self._get("mad", lambda: type(self)(np.abs(self.windows - self.quantile(0.5)[..., np.newaxis]))
+		                 .quantile(0.5))
+
+	@property
+	def clipped(self):
+		# Statistics of the windows whose outliers are clipped (winsorized), see CLIP_THRESHOLD
+		def get_clipped():
+			median = self.quantile(0.5)[..., np.newaxis]
+			threshold = CLIP_THRESHOLD * MAD_SCALE * self.mad[..., np.newaxis]
+			return type(self)(np.clip(self.windows, median - threshold, median + threshold))
+		return self._get("clipped", get_clipped)
+
+
+class NanMoments(Moments):
+	"""
+	Statistics of a batch of windows skipping their NaN values, as the nan-reductions of numpy do, each window
+	having its own number of values
+	"""
+
+	def __init__(self, windows):
+		"""
+		Initialize the statistics of the windows
+		:param np.ndarray windows: the windows, with their rows on the last axis
+		"""
+		super().__init__(windows)
+		self.valid = ~np.isnan(windows)
+		self.count = np.count_nonzero(self.valid, axis=-1)
+
+	@property
+	def min(self):
+		return self._get("min", lambda: np.min(np.where(self.valid, self.windows, np.inf), axis=-1, initial=np.inf))
+
+	@property
+	def max(self):
+		return self._get("max", lambda: np.max(np.where(self.valid, self.windows, -np.inf), axis=-1,
+		                                       initial=-np.inf))
+
+	@property
+	def mean(self):
+		return self._get("mean", lambda: np.sum(np.where(self.valid, self.windows, 0), axis=-1) / self.count)
+
+	@property
+	def deviations(self):
+		# The NaN values do not deviate, so that they do not count in the moments
+		return self._get("deviations", lambda: np.where(self.valid, self.windows - self.mean[..., np.newaxis], 0))
+
+	def quantile(self, q):
+		# Linear interpolation between the sorted values, as np.quantile does, the NaN values being sorted last
+		def get_quantile():
+			position = q * np.maximum(self.count - 1, 0)
+			lows = np.floor(position).astype(int)
+			highs = np.minimum(lows + 1, np.maximum(self.count - 1, 0))
+			low = np.take_along_axis(self.sorted, lows[..., np.newaxis], axis=-1)[..., 0]
+			high = np.take_along_axis(self.sorted, highs[..., np.newaxis], axis=-1)[..., 0]
+			return low + (high - low) * (position - lows)
+		return self._get(f"quantile{q}", get_quantile)
+
+
+def _get_skewness(moments):
+	with np.errstate(all="ignore"):
+		return np.where(moments.constant, np.nan, moments.m3 / moments.m2 ** 1.5)
+
+
+def _get_kurtosis(moments):
+	with np.errstate(all="ignore"):
+		return np.where(moments.constant, np.nan, moments.m4 / moments.m2 ** 2.0) - 3
+
+
+# The specifications which can be computed, by name
+_specs = {"min": lambda moments: moments.min,
+          "max": lambda moments: moments.max,
+          "mean": lambda moments: moments.mean,
+          "std": lambda moments: np.sqrt(moments.m2),
+          "skewn": _get_skewness,
+          "kurt": _get_kurtosis,
+          "var": lambda moments: moments.m2,
+          "ptp": lambda moments: moments.max - moments.min,
+          "median": lambda moments: moments.quantile(0.5),
+          "q25": lambda moments: moments.quantile(0.25),
+          "q75": lambda moments: moments.quantile(0.75),
+          "energy": lambda moments: moments.count * (moments.m2 + moments.mean ** 2),
+          "mad": lambda moments: moments.mad,
+          "clipped_mean": lambda moments: moments.clipped.mean,
+          "clipped_std": lambda moments: np.sqrt(moments.clipped.m2),
+          "clipped_skewn": lambda moments: _get_skewness(moments.clipped),
+          "clipped_kurt": lambda moments: _get_kurtosis(moments.clipped)}
+
+
+def register_spec(name, function, replace=False):
+	"""
+	Add a specification which can then be computed by compute_specs
+	:param str name: the name of the specification, used in the column names
+	:param function: the function computing the specification of each window from a Moments object,
+		it should use its statistics rather than the windows to keep a single pass
+	:param bool replace: True to replace a specification which already exists
+	"""
+	if name in _specs and not replace:
+		raise ValueError(f"The specification {name} already exists")
+	_specs[name] = function
+
+
+def get_specs_names():
+	"""
+	Get the names of all the specifications which can be computed
+	:return: the names
+	:rtype: list
+	"""
+	return list(_specs)
+
+
+def compute_specs(windows, specs=None, out=None, min_valid=None, positions=None):
+	"""
+	Compute specifications of each window, all of them sharing the same statistics (see Moments)
+	With SPECS_LIST, the results are the ones of get_specs_min, ..., get_specs_ptp
+	The windows are computed by blocks written one after the other in out, so that the temporary arrays of the
+	statistics (the deviations, ...) take around BLOCK_BYTES whatever the number and the overlap of the windows
+	:param np.ndarray windows: the windows, with their rows on the last axis
+	:param list specs: the names of the specifications, SPECS_LIST if None
+	:param np.ndarray out: the array where the specs are written, the specs being on its last axis
+	:param int min_valid: if given, the NaN values are skipped (see NanMoments) and the specifications of the windows
+		with less than min_valid other values are NaN, else a NaN value gives NaN specifications
+	:param np.ndarray positions: the positions of the computed windows on the axis before the rows, all the windows if
+		None : they are gathered block by block, so that only one block is copied (see get_windows_view)
+	:return: the specs of each window, on the last axis
+	:rtype: np.ndarray
+	"""
+	specs = SPECS_LIST if specs is None else specs
+	unknown = [name for name in specs if name not in _specs]
+	if unknown:
+		raise ValueError(f"Unknown specifications {unknown}, the known ones are {get_specs_names()}")
+	windows = np.asarray(windows)
+	if windows.ndim < 2:
+		if out is None:
+			out = np.empty(windows.shape[:-1] + (len(specs),))
+		_compute_block(windows, specs, out, min_valid)
+		return out
+	count = windows.shape[-2] if positions is None else len(positions)
+	if out is None:
+		out = np.empty(windows.shape[:-2] + (count, len(specs)))
+
+	# Blocks of consecutive windows (the axis before the rows), each one with all the signals of the first axes
+	window_bytes = TEMPORARY_ARRAYS * 8 * max(windows.shape[-1], 1) * int(np.prod(windows.shape[:-2]))
+	block = max(1, BLOCK_BYTES // window_bytes)
+	for first in range(0, count, block):
+		if positions is None:
+			block_windows = windows[..., first:first + block, :]
+		else:
+			block_windows = windows[..., positions[first:first + block], :]
+		_compute_block(block_windows, specs, out[..., first:first + block, :], min_valid)
+	return out
+
+
+def _compute_block(windows, specs, out, min_valid):
+	"""
+	Compute specifications of a block of windows, see compute_specs
+	:param np.ndarray windows: the windows, with their rows on the last axis
+	:param list specs: the names of the specifications
+	:param np.ndarray out: the array where the specs are written, the specs being on its last axis
+	:param int min_valid: the minimum number of values which are not NaN, None to keep the NaN values
+	"""
+	if min_valid is None:
+		# The moments are computed by the compiled kernel with the numba backend (see Utils.Kernels)
+		moments = Moments(windows, compute_moments(windows) if windows.shape[-1] > 0 else None)
+		# Each specification is measured as a stage "spec.<name>", the shared statistics being counted in the first
+		# specification needing them (the deviations in std, ...)
+		for i, name in enumerate(specs):
+			with profile_stage(f"spec.{name}"):
+				out[..., i] = _specs[name](moments)
+		return
+
+	if windows.shape[-1] == 0:
+		out[...] = np.nan
+		return
+	moments = NanMoments(windows)
+	too_few = moments.count < max(min_valid, 1)
+	with np.errstate(all="ignore"):
+		for i, name in enumerate(specs):
+			with profile_stage(f"spec.{name}"):
+				out[..., i] = np.where(too_few, np.nan, _specs[name](moments))
@@ -0,0 +1,127 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from Utils.Get import get_dataset
+from Utils.Store import load_features, load_metadata, save_features
+from Utils.Sweep import compute_datasets
+
+
+def get_stations(paths, date_column="date", sep=',', float32=False):
+	"""
+	Create the dataframe of each station from its own csv files (see get_dataset)
+	:param paths: the path or the list of paths of each station, by name, or a list of paths named after the files
+	:param str date_column: the column of the dates
+	:param char sep: the separation character
+	:param bool float32: True to read the values as float32 instead of float64
+	:return: the dataframe of each station, indexed by date, by name
+	:rtype: dict
+	"""
+	if not isinstance(paths, dict):
+		paths = {os.path.splitext(os.path.basename(path))[0]: path for path in paths}
+	return {name: get_dataset(station_paths, date_column=date_column, sep=sep, float32=float32)
+	        for name, station_paths in paths.items()}
+
+
+def get_stations_table(paths, station_column="station", date_column="date", sep=',', float32=False):
+	"""
+	Create the dataframe of each station from csv files in which the rows of all the stations are mixed,
+	the station of each row being in station_column
+	:param paths: the path to the csv file, or the list of paths
+	:param str station_column: the column of the stations
+	:param str date_column: the column of the dates
+	:param char sep: the separation character
+	:param bool float32: True to read the values as float32 instead of float64
+	:return: the dataframe of each station, indexed by date, by name
+	:rtype: dict
+	"""
+	if isinstance(paths, str):
+		paths = [paths]
+	frames = []
+	for path in paths:
+		# Only the header is read to know the columns
+		columns = pd.read_csv(path, sep=sep, nrows=0).columns
+		dtypes = {column: np.float32 if float32 else np.float64 for column in columns
+		          if column not in (date_column, station_column)}
+		dtypes[station_column] = str
+		frames.append(pd.read_csv(path, sep=sep, dtype=dtypes, parse_dates=[date_column]))
+	return split_stations(pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0],
+	                      station_column, date_column)
+
+
+def split_stations(df, station_column="station", date_column="date"):
+	"""
+	Split a dataframe of several stations in one dataframe by station, indexed by date as get_dataset does :
+	when a date is in several rows of a station, the last one is kept
+	:param pd.DataFrame df: the dataframe of all the stations
+	:param str station_column: the column of the stations
+	:param str date_column: the column of the dates, the index is used if it is not a column
+	:return: the dataframe of each station, by name
+	:rtype: dict
+	"""
+	stations = {}
+	for name, data in df.groupby(station_column, sort=True):
+		data = data.drop(columns=station_column)
+		if date_column in data.columns:
+			data = data.set_index(date_column)
+		data = data[~data.index.duplicated(keep="last")]
+		if not data.index.is_monotonic_increasing:
+			data = data.sort_index(kind="stable")
+		stations[str(name)] = data
+	return stations
+
+
+def stations_protocol(stations, dates, time_window_length, non_overlapping_length, pickle_filepath=None, jobs=None,
+                      specs=None):
+	"""
+	Run the protocol for all the stations at once, each station being processed in a pool of processes
+	(see compute_datasets), and combine their features
+	:param dict stations: the dataframe of each station, by name (see get_stations and get_stations_table)
+	:param dates: list of 2 elements : the bounds, a dict of bounds by station,
+		or None for the first and the last date of each station
+	:param int time_window_length: the length of the window
+	:param int non_overlapping_length: the number of non overlapping element
+	:param str pickle_filepath: the file where the combined features are saved (see save_features), none if None
+	:param int jobs: the number of processes, the number of CPUs if None
+	:param specs: the specifications computed, see get_columns_specs
+	:return: df_specs, y_data : the features of all the stations, indexed by (station, window), and their seasons
+	:rtype: (pd.DataFrame, list)
+	"""
+	start_time = time.time()
+	if dates is None:
+		dates = {name: [str(df.index.min().date()), str(df.index.max().date())] for name, df in stations.items()}
+
+	results = compute_datasets(stations, dates, time_window_length, non_overlapping_length, jobs, specs)
+	df_specs = pd.concat([df_station for df_station, _ in results.values()], keys=list(results),
+	                     names=["station", "window"])
+	y_data = [season for _, y_station in results.values() for season in y_station]
+
+	if pickle_filepath is not None:
+		# The index is only kept by the pickle files, the stations are saved in the metadata to restore it
+		save_features(pickle_filepath, df_specs, y_data,
+		              {"stations": [[name, len(y_station)] for name, (_, y_station) in results.items()],
+		               "dates": dates, "time_window_length": time_window_length,
+		               "non_overlapping_length": non_overlapping_length})
+	print(f"total time = {time.time() - start_time}")
+	return df_specs, y_data
+
+
+def load_stations_features(path, columns=None, mmap=False):
+	"""
+	Load the features saved by stations_protocol, indexed by (station, window) whatever their format
+	:param str path: the file (or folder for npy) where the features are saved
+	:param list columns: the specifications to load, all of them if None
+	:param bool mmap: True to map the npy file in memory instead of reading it
+	:return: df_specs, y_data
+	:rtype: (pd.DataFrame, list)
+	"""
+	df_specs, y_data = load_features(path, columns=columns, mmap=mmap)
+	stations = load_metadata(path).get("stations")
+	if stations is not None:
+		df_specs.index = pd.MultiIndex.from_arrays(
+			[np.repeat([name for name, _ in stations], [count for _, count in stations]),
+			 np.concatenate([np.arange(count) for _, count in stations] or [np.array([], dtype=int)])],
+			names=["station", "window"])
+	return df_specs, y_data
@@ -0,0 +1,188 @@
+import json
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from Utils.Profiling import profiled
+
+# Name of the column of the seasons in the parquet files
+LABEL_COLUMN = "__season__"
+
+
+def get_pyarrow():
+	"""
+	Import pyarrow, only when a parquet file is used since it is slow to import
+	:return: pyarrow and pyarrow.parquet
+	:rtype: tuple
+	"""
+	try:
+		import pyarrow as pa
+		import pyarrow.parquet as pq
+	except ImportError:
+		raise ImportError("pyarrow is needed to use parquet files")
+	return pa, pq
+
+
+def get_format(path):
+	"""
+	Get the format of a feature file from its extension
+	:param str path: the path of the file
+	:return: "pickle" for .pkl and .pickle files, "parquet" for .parquet files, else "npy" (a folder)
+	:rtype: str
+	"""
+	extension = os.path.splitext(path)[1].lower()
+	if extension in (".pkl", ".pickle"):
+		return "pickle"
+	if extension == ".parquet":
+		return "parquet"
+	return "npy"
+
+
+@profiled
+def save_features(path, df_specs, y_data, metadata=None):
+	"""
+	Save the specifications and their seasons, the format depends on the extension of the path
+	- pickle : [df_specs, y_data], as written by protocol so far, and the metadata in "<path>.json" next to it
+	- parquet : one column by specification and the seasons in LABEL_COLUMN, needs pyarrow
+	- npy : a folder with the specifications stored column by column in "features.npy",
+		the codes of the seasons in "labels.npy" and the names in "metadata.json"
+	:param str path: the file (or folder for npy) where the features are saved
+	:param pd.DataFrame df_specs: the specifications, one row by window, float32 ones are kept as float32
+	:param list y_data: the season of each window, or a pd.Categorical (see get_y_data)
+	:param dict metadata: information saved with the features
+	"""
+	file_format = get_format(path)
+	if file_format == "pickle":
+		with open(path, "wb") as f:
+			pickle.dump([df_specs, y_data], f)
+		# The pickle keeps its format [df_specs, y_data], the metadata are apart (and removed if they are not the
+		# ones of these features anymore)
+		metadata_path = get_metadata_path(path)
+		if metadata is not None:
+			with open(metadata_path, "w") as f:
+				json.dump(metadata, f)
+		elif os.path.isfile(metadata_path):
+			os.remove(metadata_path)
+		return
+
+	metadata = {} if metadata is None else metadata
+	if file_format == "parquet":
+		pa, pq = get_pyarrow()
+		table = pa.Table.from_pandas(df_specs.assign(**{LABEL_COLUMN: pd.Categorical(y_data)}),
+		                             preserve_index=False)
+		table = table.replace_schema_metadata({**table.schema.metadata, b"metadata": json.dumps(metadata).encode()})
+		pq.write_table(table, path)
+		return
+
+	# Stored column by column so that a few columns can be read from the file without reading the others
+	os.makedirs(path, exist_ok=True)
+	dtype = np.result_type(np.float32, *df_specs.dtypes)
+	np.save(os.path.join(path, "features.npy"), np.asfortranarray(df_specs.to_numpy(dtype=dtype)))
+	save_labels(path, y_data, df_specs.columns, metadata)
+
+
+def get_metadata_path(path):
+	"""
+	Get the file where the metadata of a pickle file are saved (see save_features)
+	:param str path: the pickle file
+	:return: the json file
+	:rtype: str
+	"""
+	return path + ".json"
+
+
+def create_features(path, rows, columns, dtype=np.float32):
+	"""
+	Create the features of a npy folder (see save_features) mapped in memory, to be filled in place
+	(by get_specs_columns for instance) without holding them in memory, then completed by save_labels
+	:param str path: the folder
+	:param int rows: the number of windows
+	:param list columns: the names of the specifications
+	:param dtype: the type of the specifications
+	:return: the features, to flush once filled
+	:rtype: np.memmap
+	"""
+	os.makedirs(path, exist_ok=True)
+	return np.lib.format.open_memmap(os.path.join(path, "features.npy"), mode="w+", dtype=dtype,
+	                                 shape=(rows, len(columns)), fortran_order=True)
+
+
+def save_labels(path, y_data, columns, metadata=None):
+	"""
+	Save the seasons and the names of the features of a npy folder (see save_features)
+	:param str path: the folder
+	:param list y_data: the season of each window, or a pd.Categorical (see get_y_data)
+	:param list columns: the names of the specifications
+	:param dict metadata: information saved with the features
+	"""
+	if isinstance(y_data, pd.Categorical):
+		labels, codes = np.asarray(y_data.categories, dtype=str), y_data.codes
+	else:
+		labels, codes = np.unique(np.asarray(y_data, dtype=str), return_inverse=True)
+	np.save(os.path.join(path, "labels.npy"), codes.astype(np.int8))
+	with open(os.path.join(path, "metadata.json"), "w") as f:
+		json.dump({"columns": [str(column) for column in columns], "labels": labels.tolist(),
+		           "metadata": {} if metadata is None else metadata}, f)
+
+
+@profiled
+def load_features(path, columns=None, mmap=False, categorical=False):
+	"""
+	Load the specifications and their seasons saved by save_features
+	:param str path: the file (or folder for npy) where the features are saved
+	:param list columns: the specifications to load, all of them if None
+	:param bool mmap: True to map the npy file in memory instead of reading it
+	:param bool categorical: True to get the seasons as a pd.Categorical instead of a list of strings
+	:return: df_specs, y_data
+	:rtype: (pd.DataFrame, list)
+	"""
+	file_format = get_format(path)
+	if file_format == "pickle":
+		with open(path, "rb") as f:
+			df_specs, y_data = pickle.load(f)
+		if isinstance(y_data, pd.Categorical) != categorical:
+			y_data = pd.Categorical(y_data) if categorical else list(y_data)
+		return (df_specs if columns is None else df_specs[columns]), y_data
+
+	if file_format == "parquet":
+		_, pq = get_pyarrow()
+		df_specs = pq.read_table(path, columns=None if columns is None else list(columns) + [LABEL_COLUMN]).to_pandas()
+		y_data = df_specs.pop(LABEL_COLUMN)
+		return df_specs, (pd.Categorical(y_data) if categorical else y_data.astype(str).tolist())
+
+	with open(os.path.join(path, "metadata.json")) as f:
+		description = json.load(f)
+	values = np.load(os.path.join(path, "features.npy"), mmap_mode="r" if mmap else None)
+	if columns is not None:
+		positions = {column: i for i, column in enumerate(description["columns"])}
+		values = values[:, [positions[column] for column in columns]]
+	else:
+		columns = description["columns"]
+	codes = np.load(os.path.join(path, "labels.npy"))
+	if categorical:
+		y_data = pd.Categorical.from_codes(codes, categories=description["labels"])
+	else:
+		y_data = np.asarray(description["labels"], dtype=object)[codes].tolist()
+	return pd.DataFrame(values, columns=columns, copy=False), y_data
+
+
+def load_metadata(path):
+	"""
+	Load the information saved with the features
+	:param str path: the file (or folder for npy) where the features are saved
+	:return: the metadata given to save_features, {} for a pickle file saved without them
+	:rtype: dict
+	"""
+	file_format = get_format(path)
+	if file_format == "pickle":
+		if not os.path.isfile(get_metadata_path(path)):
+			return {}
+		with open(get_metadata_path(path)) as f:
+			return json.load(f)
+	if file_format == "parquet":
+		_, pq = get_pyarrow()
+		return json.loads(pq.read_schema(path).metadata.get(b"metadata", b"{}"))
+	with open(os.path.join(path, "metadata.json")) as f:
+		return json.load(f)["metadata"]
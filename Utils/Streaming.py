@@ -0,0 +1,201 @@
+import datetime
+from collections import deque
+
+import numpy as np
+import pandas as pd
+from dateutil import parser
+
+from Utils.Get import SPECS_LIST, get_duration
+
+
+class StreamingSpecs:
+	"""
+	Incremental calculation of the specifications of the time windows, the rows being given one at a time
+	Each push costs O(1) (amortized) by signal : the moments come from running sums of powers and the min and the max
+	from monotonic deques, so the windows already emitted are never computed again.
+	The results are the ones of get_all_specs, up to the rounding of the running sums : within 1e-12 relative for
+	min, max, mean, std, var and ptp, and 1e-10 absolute for skewn and kurt (which cancel out when they are close to 0)
+	"""
+
+	def __init__(self, start, time_window_length, non_overlapping_length, columns, period=datetime.timedelta(1)):
+		"""
+		Initialize the state of the windows
+		:param start: the date of the first window, as in dates[0] of get_specs
+		:param time_window_length: The number of date in one window, or its duration (see get_duration)
+		:param non_overlapping_length: The number of different dates between two window following each other,
+			or its duration
+		:param list columns: the names of the signals of each row
+		:param datetime.timedelta period: the time between two rows, a window is complete when its last row is pushed
+		"""
+		self.columns = list(columns)
+		self.specs_columns = [f"{feature}_{signal}" for signal in self.columns for feature in SPECS_LIST]
+		self.period = pd.Timedelta(period)
+		self._length = get_duration(time_window_length)
+		self._step = get_duration(non_overlapping_length)
+		self._first = pd.Timestamp(parser.parse(start) if isinstance(start, str) else start)
+		self._last_date = None
+
+		# Rows of the current window and their running sums, shifted to keep the precision of the powers
+		size = len(self.columns)
+		self._buffer = deque()
+		self._shift = np.full(size, np.nan)
+		self._counts = np.zeros(size)
+		self._nans = np.zeros(size)
+		self._sums = np.zeros((4, size))
+		self._evicted = 0
+
+		# Monotonic deques of (date, value) : decreasing for the max, increasing for the min
+		self._maximums = [deque() for _ in range(size)]
+		self._minimums = [deque() for _ in range(size)]
+
+	def push(self, date, values):
+		"""
+		Add one row and get the windows completed by it
+		:param date: the date of the row, greater than the date of the previous row
+		:param values: the value of each signal, in the order of the columns
+		:return: the list of (first date, specs) of each completed window, specs being ordered as in get_specs_columns
+		:rtype: list
+		"""
+		date = pd.Timestamp(date)
+		if self._last_date is not None and date <= self._last_date:
+			raise ValueError(f"The date {date} is not after the previous one ({self._last_date})")
+		self._last_date = date
+		values = np.asarray(values, dtype=float)
+
+		# Windows ending before this row can not get any other row
+		res = self._emit(date)
+		self._add(date, values)
+		# Windows whose last row is this one
+		res.extend(self._emit(date + self.period))
+		return res
+
+	def update(self, df):
+		"""
+		Add all the rows of a dataframe and get the windows completed by them
+		:param pd.DataFrame df: the new rows, indexed by date and containing all the columns
+		:return: the dataframe of the specifications, indexed by the first date of each window
+		:rtype: pd.DataFrame
+		"""
+		res = []
+		for date, values in zip(df.index, df[self.columns].to_numpy(dtype=float)):
+			res.extend(self.push(date, values))
+		return pd.DataFrame([specs for _, specs in res], columns=self.specs_columns,
+		                    index=pd.DatetimeIndex([first for first, _ in res]))
+
+	def _add(self, date, values):
+		"""
+		Add one row to the current window
+		:param pd.Timestamp date: the date of the row
+		:param np.ndarray values: the value of each signal
+		"""
+		self._buffer.append((date, values))
+		valid = ~np.isnan(values)
+		self._nans += ~valid
+		self._shift = np.where(np.isnan(self._shift) & valid, values, self._shift)
+		self._accumulate(np.where(valid, values, self._shift), valid, 1)
+
+		for i in np.flatnonzero(valid):
+			maximums, minimums = self._maximums[i], self._minimums[i]
+			while maximums and maximums[-1][1] <= values[i]:
+				maximums.pop()
+			maximums.append((date, values[i]))
+			while minimums and minimums[-1][1] >= values[i]:
+				minimums.pop()
+			minimums.append((date, values[i]))
+
+	def _evict(self, first):
+		"""
+		Remove the rows before the first date of the window
+		:param pd.Timestamp first: the first date of the window
+		"""
+		cancelled = False
+		while self._buffer and self._buffer[0][0] < first:
+			_, values = self._buffer.popleft()
+			valid = ~np.isnan(values)
+			self._nans -= ~valid
+			powers = self._accumulate(np.where(valid, values, self._shift), valid, -1)
+			cancelled |= np.any(powers[3] > self._sums[3])
+			self._evicted += 1
+
+		for extremums in self._maximums + self._minimums:
+			while extremums and extremums[0][0] < first:
+				extremums.popleft()
+
+		# The running sums are computed again from the rows once in a while, so the rounding errors can not build up,
+		# and each time an outlier leaves the window since most of what remains of the sums is its rounding error
+		if cancelled or self._evicted > len(self._buffer):
+			self._refresh()
+
+	def _accumulate(self, values, valid, sign):
+		"""
+		Add or remove the powers of the values to the running sums
+		:param np.ndarray values: the values of the row
+		:param np.ndarray valid: True where the value is not NaN
+		:param int sign: 1 to add the values, -1 to remove them
+		:return: the powers of the shifted values
+		:rtype: np.ndarray
+		"""
+		shifted = np.where(valid, values - self._shift, 0)
+		powers = shifted ** np.arange(1, 5)[:, np.newaxis]
+		self._counts += sign * valid
+		self._sums += sign * powers
+		return powers
+
+	def _refresh(self):
+		"""
+		Compute the running sums from the rows of the current window, shifted by their mean
+		"""
+		self._evicted = 0
+		if not self._buffer:
+			self._sums[:] = 0
+			return
+		rows = np.array([values for _, values in self._buffer])
+		with np.errstate(invalid="ignore"):
+			mean = np.nanmean(rows, axis=0)
+		self._shift = np.where(np.isnan(mean), self._shift, mean)
+		shifted = np.nan_to_num(rows - self._shift)
+		self._sums = (shifted ** np.arange(1, 5)[:, np.newaxis, np.newaxis]).sum(axis=1)
+
+	def _emit(self, date):
+		"""
+		Get the specifications of all the windows ending before the date
+		:param pd.Timestamp date: the date after the last row of the windows
+		:return: the list of (first date, specs) of each window
+		:rtype: list
+		"""
+		res = []
+		while self._first + self._length <= date:
+			self._evict(self._first)
+			res.append((self._first, self._get_specs()))
+			self._first += self._step
+		return res
+
+	def _get_specs(self):
+		"""
+		Get the specifications of the current window from the running sums
+		:return: the specs, signal after signal
+		:rtype: np.ndarray
+		"""
+		with np.errstate(divide="ignore", invalid="ignore"):
+			counts = self._counts
+			mean = self._sums[0] / counts
+			raw = self._sums / counts
+			m2 = np.maximum(raw[1] - mean ** 2, 0)
+			m3 = raw[2] - 3 * mean * raw[1] + 2 * mean ** 3
+			m4 = raw[3] - 4 * mean * raw[2] + 6 * mean ** 2 * raw[1] - 3 * mean ** 4
+			mean = mean + self._shift
+
+			# Same conventions as scipy.stats for the (nearly) constant windows
+			zero = m2 <= (np.finfo(float).eps * mean) ** 2
+			skewness = np.where(zero, np.nan, m3 / m2 ** 1.5)
+			kurtosis = np.where(zero, np.nan, m4 / m2 ** 2 - 3)
+
+		minimum = np.array([extremums[0][1] if extremums else np.nan for extremums in self._minimums])
+		maximum = np.array([extremums[0][1] if extremums else np.nan for extremums in self._maximums])
+
+		# As with pandas, min, max, mean, std and var skip the NaN values when the others do not
+		nans = np.where(self._nans > 0, np.nan, 0)
+		specs = np.array([minimum, maximum, mean, np.sqrt(m2), skewness + nans, kurtosis + nans, m2,
+		                  maximum - minimum + nans])
+		specs[:, counts == 0] = np.nan
+		return specs.T.reshape(-1)
@@ -0,0 +1,214 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from Utils.Append import get_protocol_metadata
+from Utils.Get import get_gap_windows, get_specs_columns, get_y_data
+from Utils.Store import save_features
+
+# The dataframes attached by a worker, by dataset name
+_datasets = {}
+
+
+def share_dataframe(df):
+	"""
+	Copy the values and the index of a dataframe in shared memory blocks
+	The values are stored with one row by signal, the layout used by get_specs_columns
+	:param pd.DataFrame df: the dataframe, indexed by date
+	:return: blocks, description : the shared memory blocks (to close and unlink) and what is needed to attach them
+	:rtype: (list, dict)
+	"""
+	if not df.index.is_monotonic_increasing:
+		df = df.sort_index(kind="stable")
+	arrays = {"values": np.ascontiguousarray(df.to_numpy(dtype=float).T), "index": np.asarray(df.index)}
+	blocks = []
+	description = {"columns": list(df.columns)}
+	for key, array in arrays.items():
+		block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+		np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+		blocks.append(block)
+		description[key] = (block.name, array.shape, array.dtype.str)
+	return blocks, description
+
+
+def attach_dataframe(description):
+	"""
+	Get the dataframe stored in shared memory blocks, without any copy
+	:param dict description: the description given by share_dataframe
+	:return: blocks, df : the attached blocks (to keep while df is used) and the dataframe
+	:rtype: (list, pd.DataFrame)
+	"""
+	blocks = []
+	arrays = {}
+	for key in ("values", "index"):
+		name, shape, dtype = description[key]
+		block = shared_memory.SharedMemory(name=name)
+		blocks.append(block)
+		arrays[key] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+	df = pd.DataFrame(arrays["values"].T, index=pd.DatetimeIndex(arrays["index"]), columns=description["columns"],
+	                  copy=False)
+	return blocks, df
+
+
+def _init_worker(descriptions):
+	"""
+	Attach all the datasets once in each worker
+	:param dict descriptions: the description of each dataset, by name
+	"""
+	for name, description in descriptions.items():
+		_datasets[name] = attach_dataframe(description)
+
+
+def _run_job(name, dates, time_window_length, non_overlapping_length, pickle_filepath, specs=None, float32=False,
+             gaps=None, min_count=None, min_valid=None, period=None):
+	"""
+	Run the protocol for one dataset and one window configuration in a worker
+	:param str name: the name of the dataset
+	:param list dates: list of 2 elements : the bounds
+	:param int time_window_length: the length of the window
+	:param int non_overlapping_length: the number of non overlapping element
+	:param str pickle_filepath: the file where the specifications and the seasons are saved, see save_features
+	:param specs: the specifications computed, see get_columns_specs
+	:param bool float32: True to keep the specifications in float32 and the seasons as int8 codes
+	:param str gaps: what is done with the windows with missing rows, see get_gap_windows
+	:param int min_count: the minimum number of rows of a window, see get_gap_windows
+	:param int min_valid: the minimum number of values of a window which are not NaN, see compute_specs
+	:param period: the time between two rows, see get_gap_windows
+	:return: the name, the window configuration, the file and the time spent
+	:rtype: tuple
+	"""
+	start_time = time.time()
+	_, df = _datasets[name]
+	df, windows = get_gap_windows(df, dates, time_window_length, non_overlapping_length, gaps=gaps,
+	                              min_count=min_count, period=period)
+	df_specs = get_specs_columns(df, dates, time_window_length, non_overlapping_length, specs=specs,
+	                             dtype=np.float32 if float32 else float, windows=windows, min_valid=min_valid)
+	y_data = get_y_data(dates, time_window_length, non_overlapping_length, categorical=float32, windows=windows)
+	save_features(pickle_filepath, df_specs, y_data,
+	              get_protocol_metadata(df, dates, time_window_length, non_overlapping_length, specs))
+	return name, time_window_length, non_overlapping_length, pickle_filepath, time.time() - start_time
+
+
+def _compute_job(name, dates, time_window_length, non_overlapping_length, specs=None):
+	"""
+	Compute the specifications and the seasons of one dataset in a worker
+	:param str name: the name of the dataset
+	:param list dates: list of 2 elements : the bounds
+	:param int time_window_length: the length of the window
+	:param int non_overlapping_length: the number of non overlapping element
+	:param specs: the specifications computed, see get_columns_specs
+	:return: the name, the specifications and the seasons
+	:rtype: (str, pd.DataFrame, list)
+	"""
+	_, df = _datasets[name]
+	return (name, get_specs_columns(df, dates, time_window_length, non_overlapping_length, specs=specs),
+	        get_y_data(dates, time_window_length, non_overlapping_length))
+
+
+@contextmanager
+def shared_executor(datasets, jobs=None):
+	"""
+	Get a pool of processes in which the datasets are available without being pickled for each job :
+	they are copied once in shared memory, attached by each worker and removed when the pool is closed
+	:param dict datasets: the dataframes, by name
+	:param int jobs: the number of processes, the number of CPUs if None
+	:return: the pool, whose jobs find the dataframes in _datasets
+	:rtype: ProcessPoolExecutor
+	"""
+	blocks = []
+	descriptions = {}
+	try:
+		for name, df in datasets.items():
+			dataset_blocks, descriptions[name] = share_dataframe(df)
+			blocks.extend(dataset_blocks)
+		
+		with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(descriptions,)) as executor:
+			yield executor
+	finally:
+		for block in blocks:
+			block.close()
+			block.unlink()
+
+
+def compute_datasets(datasets, dates, time_window_length, non_overlapping_length, jobs=None, specs=None):
+	"""
+	Compute the specifications and the seasons of each dataset in a pool of processes (see shared_executor)
+	:param dict datasets: the dataframes, by name
+	:param dates: list of 2 elements : the bounds, or a dict of bounds by dataset name
+	:param int time_window_length: the length of the window
+	:param int non_overlapping_length: the number of non overlapping element
+	:param int jobs: the number of processes, the number of CPUs if None
+	:param specs: the specifications computed, see get_columns_specs
+	:return: (df_specs, y_data) of each dataset, by name, in the order of datasets
+	:rtype: dict
+	"""
+	with shared_executor(datasets, jobs) as executor:
+		futures = [executor.submit(_compute_job, name, dates[name] if isinstance(dates, dict) else dates,
+		                           time_window_length, non_overlapping_length, specs)
+		           for name in datasets]
+		res = {}
+		for future in as_completed(futures):
+			name, df_specs, y_data = future.result()
+			res[name] = df_specs, y_data
+	return {name: res[name] for name in datasets}
+
+
+def sweep_protocol(datasets, configurations, dates, output_path, jobs=None, extension=".pkl", specs=None,
+                   float32=False, gaps=None, min_count=None, min_valid=None, period=None):
+	"""
+	Run the protocol for each dataset and each window configuration in a pool of processes
+	The datasets are shared with the workers through shared memory instead of being pickled for each job.
+	One file is saved by dataset and configuration : "<name><time_window_length>-<non_overlapping_length><extension>"
+	:param dict datasets: the dataframes, by name
+	:param list configurations: list of (time_window_length, non_overlapping_length), or of
+		(time_window_length, non_overlapping_length, file name) to choose the name of the file, which is then
+		prefixed by the name of the dataset when there are several datasets ("<name><file name>")
+	:param dates: list of 2 elements : the bounds, or a dict of bounds by dataset name
+	:param str output_path: the folder where the files are saved
+	:param int jobs: the number of processes, the number of CPUs if None
+	:param str extension: the extension of the files, which gives their format (see save_features)
+	:param specs: the specifications computed, see get_columns_specs
+	:param bool float32: True to keep the specifications in float32 and the seasons as int8 codes
+	:param str gaps: what is done with the windows with missing rows, see get_gap_windows
+	:param int min_count: the minimum number of rows of a window, see get_gap_windows
+	:param int min_valid: the minimum number of values of a window which are not NaN, see compute_specs
+	:param period: the time between two rows, see get_gap_windows
+	:return: the list of (name, time_window_length, non_overlapping_length, file, time) of each job
+	:rtype: list
+	"""
+	start_time = time.time()
+	# The files of all the jobs, checked before any job runs so that no job overwrites the file of another one
+	jobs_files = []
+	for name in datasets:
+		for configuration in configurations:
+			time_window_length, non_overlapping_length = configuration[:2]
+			if len(configuration) <= 2:
+				file_name = f"{name}{time_window_length}-{non_overlapping_length}{extension}"
+			else:
+				file_name = configuration[2] if len(datasets) == 1 else f"{name}{configuration[2]}"
+			jobs_files.append((name, time_window_length, non_overlapping_length, os.path.join(output_path, file_name)))
+	paths = [path for _, _, _, path in jobs_files]
+	duplicates = sorted({path for path in paths if paths.count(path) > 1})
+	if duplicates:
+		raise ValueError(f"Several jobs would save their features in the same files : {duplicates}")
+	
+	os.makedirs(output_path, exist_ok=True)
+	res = []
+	with shared_executor(datasets, jobs) as executor:
+		futures = []
+		for name, time_window_length, non_overlapping_length, path in jobs_files:
+			futures.append(executor.submit(_run_job, name, dates[name] if isinstance(dates, dict) else dates,
+			                               time_window_length, non_overlapping_length, path, specs, float32, gaps,
+			                               min_count, min_valid, period))
+		for future in as_completed(futures):
+			name, time_window_length, non_overlapping_length, _, job_time = future.result()
+			print(f"{name} {time_window_length}-{non_overlapping_length} : time = {job_time}")
+			res.append(future.result())
+
+	print(f"total time = {time.time() - start_time}")
+	return res
@@ -1,80 +1,332 @@
+import argparse
+import glob
+import json
 import os
-import pickle
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
 from matplotlib import pyplot as plt
+from matplotlib.figure import Figure
 from sklearn.ensemble import ExtraTreesClassifier
+from sklearn.feature_selection import mutual_info_classif
 
+from Utils.Get import get_features_specs
+from Utils.Profiling import profile_stage, profiled
+from Utils.Store import load_features, load_metadata, save_features
 
-def dim_reduc_protocol(pickle_filepath, plot_file_name):
+WINDOW_PARAMETERS = ["dates", "time_window_length", "non_overlapping_length"]
+
+
+@profiled
+def get_prescreened_columns(x, y, prescreen, prescreen_size=None, random_state=None):
 	"""
-	Execute the dimensionality reduction protocol to the given pickle file
-	:param str pickle_filepath: The pickle file
-	:param str plot_file_name: The name given to each plot created
+	Get the features kept by a filter much cheaper than the trees, used before them
+	:param pd.DataFrame x: the features
+	:param list y: the labels
+	:param str prescreen: "variance" to remove the constant features,
+		"mutual_info" to keep the prescreen_size features with the most mutual information with the labels
+	:param int prescreen_size: the number of features kept by "mutual_info", all of them if None
+	:param int random_state: the seed of the mutual information estimation
+	:return: the kept features, in the order of x
+	:rtype: pd.Index
 	"""
-	####################################################################################################################
-	#                                                 LOAD THE DATASET                                                 #
-	####################################################################################################################
-	
-	# Load the dataset (you can modify the variables to be load. In this case, we have x an array of the features extracted
-	# for each instance and y a list of labels)
-	with open(pickle_filepath, 'rb') as file:
-		x, y = pickle.load(file)
+	values = x.to_numpy(dtype=float)
+	if prescreen == "variance":
+		with np.errstate(all="ignore"):
+			variances = np.nanvar(values, axis=0)
+		return x.columns[variances > 0]
+	if prescreen == "mutual_info":
+		# The NaN values (skewness of the constant windows, ...) are replaced by the median of their feature
+		medians = np.nan_to_num(np.nanmedian(values, axis=0)) if np.isnan(values).any() else None
+		if medians is not None:
+			values = np.where(np.isnan(values), medians, values)
+		scores = mutual_info_classif(values, y, random_state=random_state)
+		return x.columns[np.sort(np.argsort(scores, kind="stable")[::-1][:prescreen_size])]
+	raise ValueError(f"Unknown prescreen {prescreen}, use 'variance' or 'mutual_info'")
+
+
+@profiled
+def select_features(x, y, attribute_number_to_select, n_estimators=50, n_jobs=None, random_state=None, sample=None,
+                    prescreen=None, prescreen_size=None, tree_step=None):
+	"""
+	Select the most important features according to an ExtraTreesClassifier
+	:param pd.DataFrame x: the features
+	:param list y: the labels
+	:param int attribute_number_to_select: the number of features selected
+	:param int n_estimators: the number of trees
+	:param int n_jobs: the number of trees grown at once, -1 for all the CPUs, 1 if None
+	:param int random_state: the seed of the trees, of the sampling and of the prescreen, for reproducible selections
+	:param sample: the rows used to fit the trees, all of them if None, a number of rows if int,
+		a fraction of the rows if float
+	:param str prescreen: the filter applied before the trees (see get_prescreened_columns), none if None
+	:param int prescreen_size: the number of features kept by the prescreen,
+		twice the number of selected features if None
+	:param int tree_step: if given, the forest is grown tree_step trees at a time (warm start) and stops before
+		n_estimators trees once the selected features are the same after two steps
+	:return: columns_to_select, importance_scores : the selected features, the most important first,
+		and the importance of each feature of x (0 for the ones removed by the prescreen)
+	:rtype: (pd.Index, np.ndarray)
+	"""
+	rng = np.random.default_rng(random_state)
+	rows = slice(None)
+	if sample is not None:
+		sample_size = int(round(sample * len(x))) if isinstance(sample, float) else sample
+		if sample_size < len(x):
+			rows = np.sort(rng.choice(len(x), size=sample_size, replace=False))
+	x_fit = x.iloc[rows]
+	y_fit = np.asarray(y, dtype=object)[rows]
 	
-	# Define the number of attribute to select
-	attribute_number_to_select = int(len(x.columns) / 2)
-	
-	####################################################################################################################
-	#                                  REDUCE THE DIMENSIONALITY BY SELECTING FEATURES                                 #
-	####################################################################################################################
+	columns = x.columns
+	if prescreen is not None:
+		if prescreen_size is None:
+			prescreen_size = 2 * attribute_number_to_select
+		columns = get_prescreened_columns(x_fit, y_fit, prescreen, prescreen_size, random_state)
+		x_fit = x_fit[columns]
 	
 	# Define the classifier
-	classifier_model = ExtraTreesClassifier(n_estimators=50)
+	classifier_model = ExtraTreesClassifier(n_estimators=n_estimators if tree_step is None else tree_step,
+	                                        n_jobs=n_jobs, random_state=random_state,
+	                                        warm_start=tree_step is not None)
+	
+	def get_selected():
+		indices = np.argsort(classifier_model.feature_importances_)[::-1]
+		return columns[indices[0:attribute_number_to_select]]
 	
 	# Train the classifier model to classify correctly the instances into the correct classes
-	classifier_model = classifier_model.fit(x, y)
+	with profile_stage("dim_reduc_protocol.fit"):
+		classifier_model = classifier_model.fit(x_fit, y_fit)
+		if tree_step is not None:
+			# More trees are added until the selection does not change anymore
+			columns_to_select = get_selected()
+			while classifier_model.n_estimators < n_estimators:
+				classifier_model.n_estimators = min(classifier_model.n_estimators + tree_step, n_estimators)
+				classifier_model = classifier_model.fit(x_fit, y_fit)
+				previous, columns_to_select = columns_to_select, get_selected()
+				if set(previous) == set(columns_to_select):
+					break
 	
 	# Get the score of importances for each attribute
-	importance_scores = classifier_model.feature_importances_
-	
-	# Maintenant c'est a votre tour de coder le reste.
-	# Le reste doit extraire de x les N meilleurs attributs et afficher un rapport des attributs selectionnes par ordre
-	# croissant d'importances. Puis a la fin, vous sauvegarderez le nouveau dataset.
+	importance_scores = np.zeros(len(x.columns))
+	importance_scores[x.columns.get_indexer(columns)] = classifier_model.feature_importances_
 	
 	# Sort the features importances and get the ordered indices
 	indices = np.argsort(importance_scores)[::-1]
 	# Get the best features according to the reduction algorithm
-	columns_to_select = x.columns[indices[0:attribute_number_to_select]]
-	# Get the new dataset with the selected features
-	new_dataset = x[columns_to_select]
+	return x.columns[indices[0:attribute_number_to_select]], importance_scores
+
+
+def select_features_sets(feature_sets, jobs=None, **kwargs):
+	"""
+	Select the features of several feature sets at once
+	The selections run in threads : the trees are grown without holding the GIL and the feature sets are not copied
+	:param dict feature_sets: (x, y, attribute_number_to_select) by name
+	:param int jobs: the number of feature sets processed at once, the number of CPUs if None
+	:param kwargs: the other parameters of select_features, n_jobs being better left to 1 with several jobs
+	:return: the result of select_features for each feature set, by name
+	:rtype: dict
+	"""
+	with ThreadPoolExecutor(max_workers=jobs or os.cpu_count()) as executor:
+		futures = {name: executor.submit(select_features, x, y, attribute_number_to_select, **kwargs)
+		           for name, (x, y, attribute_number_to_select) in feature_sets.items()}
+		return {name: future.result() for name, future in futures.items()}
+
+
+@profiled
+def save_selection(output_path, name, source, x, y, columns_to_select, importance_scores, extension=".pickle",
+                   window=None):
+	"""
+	Save the dataset reduced to the selected features and the report of the importances, which is also the selection
+	applied to new data by score_features
+	:param str output_path: the folder where the dataset is saved in "Pickles" and the report in "Reports"
+	:param str name: the name of the dataset and of the report
+	:param str source: the feature file the selection has been made from
+	:param pd.DataFrame x: the features
+	:param list y: the labels
+	:param pd.Index columns_to_select: the selected features, the most important first
+	:param np.ndarray importance_scores: the importance of each feature of x
+	:param str extension: the extension of the dataset, which gives its format (see save_features)
+	:param dict window: the parameters of the windows of the features (dates, time_window_length,
+		non_overlapping_length), read from the metadata of source if None (see get_protocol_metadata)
+	:return: the path of the report
+	:rtype: str
+	"""
+	if window is None:
+		metadata = load_metadata(source)
+		window = {parameter: metadata[parameter] for parameter in WINDOW_PARAMETERS if parameter in metadata}
+	
+	# Save the dataset as Pickle file
+	os.makedirs(os.path.join(output_path, "Pickles"), exist_ok=True)
+	save_features(os.path.join(output_path, "Pickles", name + extension), x[columns_to_select], y)
+	
+	report_path = os.path.join(output_path, "Reports", name + ".json")
+	os.makedirs(os.path.dirname(report_path), exist_ok=True)
+	with open(report_path, "w") as f:
+		json.dump({"source": source,
+		           "selected": [str(column) for column in columns_to_select],
+		           "importances": {str(column): float(score) for column, score in zip(x.columns, importance_scores)},
+		           "window": window,
+		           "specs": get_features_specs([str(column) for column in columns_to_select])},
+		          f, indent=1)
+	return report_path
+
+
+@profiled
+def plot_importances(report_path, plot_filepath, show=False):
+	"""
+	Plot the importances of the selected features of a report written by save_selection
+	:param str report_path: the report
+	:param str plot_filepath: the png file where the plot is saved
+	:param bool show: True to show the plot, which blocks until it is closed,
+		else the figure is drawn without pyplot so that no display is needed
+	"""
+	with open(report_path) as f:
+		report = json.load(f)
+	columns_to_select = report["selected"]
+	scores = np.array([report["importances"][column] for column in columns_to_select])
 	
 	#  Plot the results
-	plt.bar(x=np.arange(attribute_number_to_select), height=importance_scores[indices[0:attribute_number_to_select]],
-	        tick_label=columns_to_select)
+	fig = plt.figure() if show else Figure()
+	ax = fig.subplots()
+	ax.bar(x=np.arange(len(columns_to_select)), height=scores, tick_label=columns_to_select)
 	
-	plt.title(f"Feature Importances - Sum = {str(np.sum(importance_scores[indices[0:attribute_number_to_select]]))}")
-	plt.xlabel(f"Selected features")
-	plt.xticks(rotation=90)
-	plt.ylabel(f"Importance score")
-	plt.tight_layout()
+	ax.set_title(f"Feature Importances - Sum = {str(np.sum(scores))}")
+	ax.set_xlabel(f"Selected features")
+	ax.tick_params(axis="x", labelrotation=90)
+	ax.set_ylabel(f"Importance score")
+	fig.tight_layout()
 	
 	# Save the results
-	plot_path = "../Files/Out/Plots/"
-	if os.path.isfile(plot_path + plot_file_name):
-		os.remove(plot_path + plot_file_name)
-	plt.savefig(plot_path + plot_file_name + ".png")
+	os.makedirs(os.path.dirname(plot_filepath) or ".", exist_ok=True)
+	fig.savefig(plot_filepath)
 	
 	# Show the results
-	plt.show()
-	plt.close()
+	if show:
+		plt.show()
+		plt.close(fig)
+
+
+def render_importance_plots(output_path, names=None):
+	"""
+	Plot the reports of save_selection, to defer the plots of dim_reduc_batch to a separate stage
+	:param str output_path: the folder with the reports in "Reports", the plots are saved in "Plots"
+	:param list names: the names of the reports plotted, all of them if None
+	:return: the paths of the plots
+	:rtype: list
+	"""
+	if names is None:
+		names = sorted(os.path.splitext(os.path.basename(path))[0]
+		               for path in glob.glob(os.path.join(output_path, "Reports", "*.json")))
+	plot_paths = []
+	for name in names:
+		plot_paths.append(os.path.join(output_path, "Plots", name + ".png"))
+		plot_importances(os.path.join(output_path, "Reports", name + ".json"), plot_paths[-1])
+	return plot_paths
+
+
+@profiled
+def dim_reduc_protocol(pickle_filepath, plot_file_name, columns=None, n_estimators=50, n_jobs=None, random_state=None,
+                       sample=None, prescreen=None, prescreen_size=None, tree_step=None, output_path=os.path.join("Files", "Out"),
+                       plot=True, show=True, extension=".pickle", window=None):
+	"""
+	Execute the dimensionality reduction protocol to the given pickle file
+	:param str pickle_filepath: The pickle file, or any feature file saved by save_features
+	:param str plot_file_name: The name given to each plot created, and to the reduced dataset and its report
+	:param list columns: the features among which the selection is made, all of them if None
+	:param n_estimators, n_jobs, random_state, sample, prescreen, prescreen_size, tree_step: see select_features
+	:param str output_path: the folder where the results are saved (see save_selection), the plot in "Plots"
+	:param bool plot: False to skip the plot, which can be made later by render_importance_plots
+	:param bool show: True to show the plot
+	:param str extension: the extension of the reduced dataset, which gives its format (see save_features)
+	:param dict window: the parameters of the windows of the features, see save_selection
+	:return: the path of the report
+	:rtype: str
+	"""
+	####################################################################################################################
+	#                                                 LOAD THE DATASET                                                 #
+	####################################################################################################################
 	
-	# Save the dataset as Pickle file
-	pickle_filepath = "../Files/Out/Pickles/"
+	# Load the dataset (you can modify the variables to be load. In this case, we have x an array of the features extracted
+	# for each instance and y a list of labels)
+	x, y = load_features(pickle_filepath, columns=columns, mmap=True)
+	
+	# Define the number of attribute to select
+	attribute_number_to_select = int(len(x.columns) / 2)
+	
+	####################################################################################################################
+	#                                  REDUCE THE DIMENSIONALITY BY SELECTING FEATURES                                 #
+	####################################################################################################################
 	
-	with open(os.path.join(pickle_filepath, plot_file_name + ".pickle"), "wb") as f:
-		pickle.dump([new_dataset, y], f)
+	columns_to_select, importance_scores = select_features(x, y, attribute_number_to_select, n_estimators, n_jobs,
+	                                                       random_state, sample, prescreen, prescreen_size, tree_step)
+	
+	# Save the reduced dataset and the report of the importances, then plot it
+	report_path = save_selection(output_path, plot_file_name, pickle_filepath, x, y, columns_to_select,
+	                             importance_scores, extension, window)
+	if plot:
+		plot_importances(report_path, os.path.join(output_path, "Plots", plot_file_name + ".png"), show)
+	return report_path
+
+
+@profiled
+def dim_reduc_batch(feature_files, output_path, columns=None, jobs=None, plot=False, extension=".pickle", window=None,
+                    **kwargs):
+	"""
+	Execute the dimensionality reduction protocol to many feature files without any interaction, for batch workers
+	The selections run at once in threads (see select_features_sets), the plots are made afterwards if asked,
+	or later by render_importance_plots
+	:param feature_files: the feature files (saved by save_features), by name or as a list named after the files
+	:param str output_path: the folder where the results are saved, see save_selection
+	:param list columns: the features among which the selection is made, all of them if None
+	:param int jobs: the number of files processed at once, the number of CPUs if None
+	:param bool plot: True to plot the importances once all the selections are made
+	:param str extension: the extension of the reduced datasets, which gives their format (see save_features)
+	:param dict window: the parameters of the windows of the features, read from the metadata of each file
+		(saved by protocol) if None, see save_selection
+	:param kwargs: the other parameters of select_features, n_jobs being better left to 1 with several jobs
+	:return: the path of the report of each file, by name
+	:rtype: dict
+	"""
+	if not isinstance(feature_files, dict):
+		feature_files = {os.path.splitext(os.path.basename(os.path.normpath(path)))[0]: path for path in feature_files}
+	
+	def run(name, path):
+		x, y = load_features(path, columns=columns, mmap=True)
+		columns_to_select, importance_scores = select_features(x, y, int(len(x.columns) / 2), **kwargs)
+		return save_selection(output_path, name, path, x, y, columns_to_select, importance_scores, extension, window)
+	
+	with ThreadPoolExecutor(max_workers=jobs or os.cpu_count()) as executor:
+		futures = {name: executor.submit(run, name, path) for name, path in feature_files.items()}
+		report_paths = {name: future.result() for name, future in futures.items()}
+	if plot:
+		render_importance_plots(output_path, list(report_paths))
+	return report_paths
 
 
 if __name__ == '__main__':
-	dim_reduc_protocol("../Files/Out/Pickles/DailyDelhiClimate1.pkl", "DimReduction30-7")
-	dim_reduc_protocol("../Files/Out/Pickles/DailyDelhiClimate2.pkl", "DimReduction20-5")
+	argument_parser = argparse.ArgumentParser(description="Dimensionality reduction of feature files, the two "
+	                                                      "DailyDelhiClimate files saved by main.py interactively if "
+	                                                      "none is given",
+	                                          epilog="Run from the root of the repository : "
+	                                                 "python -m Utils.dimentionalityReduction [files ...]")
+	argument_parser.add_argument("files", nargs="*", help="the feature files, saved by save_features")
+	argument_parser.add_argument("--output", default=os.path.join("Files", "Out"),
+	                             help="the folder where the results are saved")
+	argument_parser.add_argument("--jobs", type=int, default=None, help="the number of files processed at once")
+	argument_parser.add_argument("--n-jobs", type=int, default=None, help="the number of trees grown at once")
+	argument_parser.add_argument("--seed", type=int, default=None)
+	argument_parser.add_argument("--plot", action="store_true", help="plot the importances after the selections")
+	argument_parser.add_argument("--render", action="store_true",
+	                             help="only plot the reports already saved in the output folder")
+	arguments = argument_parser.parse_args()
+	
+	if arguments.render:
+		render_importance_plots(arguments.output)
+	elif arguments.files:
+		dim_reduc_batch(arguments.files, arguments.output, jobs=arguments.jobs, plot=arguments.plot,
+		                n_jobs=arguments.n_jobs, random_state=arguments.seed)
+	else:
+		# The files saved by main.py, both run from the root of the repository
+		dim_reduc_protocol(os.path.join("Files", "Out", "Pickles", "DailyDelhiClimate1.pkl"), "DimReduction30-7",
+		                   window={"time_window_length": 30, "non_overlapping_length": 7})
+		dim_reduc_protocol(os.path.join("Files", "Out", "Pickles", "DailyDelhiClimate2.pkl"), "DimReduction20-5",
+		                   window={"time_window_length": 20, "non_overlapping_length": 5})
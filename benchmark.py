@@ -0,0 +1,218 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+import warnings
+
+import numpy as np
+import pandas as pd
+
+
+def get_synthetic_data(days, columns, freq="D", seed=0) -> pd.DataFrame:
+	"""
+	Create a climate-like dataframe : a yearly and a daily cycle plus some noise for each column
+	:param int days: the number of days covered by the data
+	:param int columns: the number of columns
+	:param str freq: the time between two rows, as a pandas frequency ("D", "h", "15min", ...)
+	:param int seed: the seed of the noise
+	:return: the dataframe indexed by date
+	:rtype: pd.DataFrame
+	"""
+	period = pd.Timedelta(pd.tseries.frequencies.to_offset(freq).nanos)
+	index = pd.date_range("2000-01-01", periods=int(pd.Timedelta(days=days) / period), freq=freq)
+	rng = np.random.default_rng(seed)
+	years = ((index - index[0]) / pd.Timedelta(days=365.25)).to_numpy()
+	data = {}
+	for i in range(columns):
+		cycle = 10 * np.sin(2 * np.pi * (years + i / columns)) + np.sin(2 * np.pi * years * 365.25)
+		data[f"signal{i}"] = 20 + i + cycle + rng.normal(scale=2, size=len(index))
+	return pd.DataFrame(data, index=pd.DatetimeIndex(index, name="date"))
+
+
+@contextlib.contextmanager
+def working_directory(path):
+	"""
+	Change the working directory while the context is used
+	:param str path: the working directory
+	"""
+	previous = os.getcwd()
+	os.chdir(path)
+	try:
+		yield
+	finally:
+		os.chdir(previous)
+
+
+def get_stages(df, dates, time_window_length, non_overlapping_length, folder, stages=None):
+	"""
+	Get the stages of the pipeline to measure, each one is a function without parameter
+	:param pd.DataFrame df: the data
+	:param list dates: list of 2 elements : the bounds
+	:param int time_window_length: the length of the window
+	:param int non_overlapping_length: the number of non overlapping element
+	:param str folder: a folder with the Files/Out tree used by protocol and dim_reduc_protocol
+	:param list stages: the stages which will be measured, all of them if None, so that only their inputs are prepared
+	:return: the stages by name
+	:rtype: dict
+	"""
+	from Utils.Get import get_all_specs, get_specs, get_specs_columns, get_y_data
+	from Utils.Store import save_features
+	from Utils.dimentionalityReduction import dim_reduc_protocol
+	from main import protocol
+
+	window = df.iloc[:max(1, len(df) * time_window_length // max(1, (df.index[-1] - df.index[0]).days))]
+
+	def run_protocol():
+		with working_directory(folder), contextlib.redirect_stdout(io.StringIO()):
+			protocol(df, dates, time_window_length, non_overlapping_length, "benchmark.pkl", "")
+
+	# The features reduced by dim_reduc_protocol are its own, so that it does not depend on the protocol stage,
+	# they are computed here to keep them out of its measure
+	features_path = os.path.join(folder, "work", "features.pkl")
+	if stages is None or "dim_reduc_protocol" in stages:
+		save_features(features_path, get_specs_columns(df, dates, time_window_length, non_overlapping_length),
+		              get_y_data(dates, time_window_length, non_overlapping_length))
+
+	def run_dim_reduc_protocol():
+		with warnings.catch_warnings():
+			warnings.simplefilter("ignore")
+			dim_reduc_protocol(features_path, "benchmark", output_path=os.path.join(folder, "Files", "Out"), show=False)
+
+	return {"get_all_specs": lambda: get_all_specs(window[df.columns[0]]),
+	        "get_specs": lambda: get_specs(df, df.columns[0], dates, time_window_length, non_overlapping_length),
+	        "get_specs_columns": lambda: get_specs_columns(df, dates, time_window_length, non_overlapping_length),
+	        "get_y_data": lambda: get_y_data(dates, time_window_length, non_overlapping_length),
+	        "protocol": run_protocol,
+	        "dim_reduc_protocol": run_dim_reduc_protocol}
+
+
+def measure(function, repeat):
+	"""
+	Measure the time of a function and its peak of memory
+	:param function: the function, without parameter
+	:param int repeat: the number of timed calls
+	:return: the times of each call in seconds and the peak of memory in bytes (measured in another call)
+	:rtype: (list, int)
+	"""
+	times = []
+	for _ in range(repeat):
+		start_time = time.perf_counter()
+		function()
+		times.append(time.perf_counter() - start_time)
+
+	# The memory is traced apart since tracing slows down the allocations
+	tracemalloc.start()
+	function()
+	_, peak = tracemalloc.get_traced_memory()
+	tracemalloc.stop()
+	return times, peak
+
+
+def get_commit():
+	"""
+	Get the commit of the measured code
+	:return: the hash of the commit, or None outside of a git repository
+	:rtype: str
+	"""
+	try:
+		return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+		                      cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+
+def benchmark(days, columns, freqs, stages=None, repeat=3, time_window_length=30, non_overlapping_length=7):
+	"""
+	Measure each stage of the pipeline on synthetic data of each size
+	:param list days: the numbers of days covered by the data
+	:param list columns: the numbers of columns
+	:param list freqs: the times between two rows, as pandas frequencies
+	:param list stages: the names of the stages to measure, all of them if None
+	:param int repeat: the number of timed calls of each stage
+	:param int time_window_length: the length of the window
+	:param int non_overlapping_length: the number of non overlapping element
+	:return: the report, with one result by data size and stage
+	:rtype: dict
+	"""
+	import matplotlib
+	matplotlib.use("Agg")
+	from Utils.Kernels import get_backend
+
+	report = {"commit": get_commit(), "date": pd.Timestamp.now().isoformat(), "python": platform.python_version(),
+	          "numpy": np.__version__, "pandas": pd.__version__, "backend": get_backend(), "repeat": repeat,
+	          "time_window_length": time_window_length, "non_overlapping_length": non_overlapping_length,
+	          "results": []}
+	with tempfile.TemporaryDirectory() as folder:
+		for path in ("Files/Out/Pickles", "Files/Out/Plots", "work"):
+			os.makedirs(os.path.join(folder, path))
+
+		for day_count in days:
+			for column_count in columns:
+				for freq in freqs:
+					df = get_synthetic_data(day_count, column_count, freq)
+					dates = [str(df.index[0].date()), str(df.index[-1].date())]
+					functions = get_stages(df, dates, time_window_length, non_overlapping_length, folder, stages)
+					for stage in (functions if stages is None else stages):
+						times, peak = measure(functions[stage], repeat)
+						result = {"stage": stage, "days": day_count, "columns": column_count, "freq": freq,
+						          "rows": len(df), "times": times, "best": min(times), "mean": float(np.mean(times)),
+						          "peak_memory": peak}
+						print(f"{stage:>20} {day_count:>6} days {column_count:>4} columns {freq:>4} : "
+						      f"best = {result['best']:.6f} s, peak memory = {peak / 2 ** 20:.1f} MiB")
+						report["results"].append(result)
+	return report
+
+
+def compare(old_report, new_report):
+	"""
+	Print the ratio of the best times of two reports for the measures they both have
+	:param dict old_report: the reference report
+	:param dict new_report: the compared report
+	"""
+	def key(result):
+		return result["stage"], result["days"], result["columns"], result["freq"]
+
+	old_results = {key(result): result for result in old_report["results"]}
+	print(f"{old_report.get('commit')} -> {new_report.get('commit')}")
+	for result in new_report["results"]:
+		old = old_results.get(key(result))
+		if old is not None:
+			stage, day_count, column_count, freq = key(result)
+			print(f"{stage:>20} {day_count:>6} days {column_count:>4} columns {freq:>4} : "
+			      f"time x{result['best'] / old['best']:.3f}, memory x{result['peak_memory'] / max(old['peak_memory'], 1):.3f}")
+
+
+if __name__ == '__main__':
+	argument_parser = argparse.ArgumentParser(description="Benchmark of the feature extraction pipeline")
+	argument_parser.add_argument("--days", type=int, nargs="+", default=[365, 3650])
+	argument_parser.add_argument("--columns", type=int, nargs="+", default=[4])
+	argument_parser.add_argument("--freqs", nargs="+", default=["D"])
+	argument_parser.add_argument("--stages", nargs="+", default=None)
+	argument_parser.add_argument("--repeat", type=int, default=3)
+	argument_parser.add_argument("--window", type=int, nargs=2, default=[30, 7],
+	                             metavar=("TIME_WINDOW_LENGTH", "NON_OVERLAPPING_LENGTH"))
+	argument_parser.add_argument("--backend", choices=["auto", "numba", "numpy"], default=None,
+	                             help="the backend of the moments, see Utils.Kernels")
+	argument_parser.add_argument("--output", default=None, help="the JSON file where the results are written")
+	argument_parser.add_argument("--compare", nargs=2, default=None, metavar=("OLD", "NEW"),
+	                             help="compare two JSON files instead of measuring")
+	arguments = argument_parser.parse_args()
+
+	if arguments.backend is not None:
+		from Utils.Kernels import set_backend
+		set_backend(arguments.backend)
+	if arguments.compare is not None:
+		with open(arguments.compare[0]) as f_old, open(arguments.compare[1]) as f_new:
+			compare(json.load(f_old), json.load(f_new))
+	else:
+		results = benchmark(arguments.days, arguments.columns, arguments.freqs, arguments.stages, arguments.repeat,
+		                    *arguments.window)
+		if arguments.output is not None:
+			with open(arguments.output, "w") as f:
+				json.dump(results, f, indent=1)
@@ -1,91 +1,295 @@
+import argparse
 import os
-import pickle
 import time
 
-import pandas as pd
+from Utils.Profiling import profiled
 
-from Utils.Get import get_data, get_nan, get_duplicate, get_specs, get_y_data
-from Utils.Graphics import plot_time_slider
+# numpy, pandas, scipy and the modules using them are imported in the functions, so that --help starts fast
 
+# The runs made without any window given : (time_window_length, non_overlapping_length, file name)
+DEFAULT_RUNS = [(30, 7, "DailyDelhiClimate1"), (20, 5, "DailyDelhiClimate2")]
+DEFAULT_FILES = ["Files/DailyDelhiClimateTrain.csv", "Files/DailyDelhiClimateTest.csv"]
+EXTENSIONS = {"pkl": ".pkl", "parquet": ".parquet", "npy": ""}
 
-def protocol(df, dates, time_window_length, non_overlapping_length, pickle_file, time_slider_path):
+
+@profiled
+def protocol(df, dates, time_window_length, non_overlapping_length, pickle_file, time_slider_path, batch=True,
+             cache_path=None, cache_size=2 ** 30, append=False, specs=None, float32=False, memmap=False, gaps=None,
+             min_count=None, output_path=os.path.join("Files", "Out", "Pickles"), pyramid=None, min_valid=None,
+             period=None):
 	"""
 	The protocol of the subject
 	:param pd.DataFrame df: the used DataFrame
 	:param list dates: list of 2 elements : the bounds
 	:param int time_window_length: the length of the window
 	:param int non_overlapping_length: the number of non overlapping element
-	:param str pickle_file: name of the pickle file, will be saved in "/Files/Out/Pickles"
+	:param str pickle_file: name of the pickle file, will be saved in output_path
+		its extension gives the format : .pkl, .parquet or none for a folder of npy files (see save_features)
 	:param str time_slider_path: The folder where the plots will be saved
+	:param bool batch: True to extract the specifications of all the columns at once
+	:param str cache_path: the folder where the results are cached, no cache if None
+	:param int cache_size: the maximum size of the cache in bytes
+	:param bool append: True to extend the saved features with the new rows of the dataframe instead of computing
+		all of them again (npy and parquet formats only)
+	:param specs: the specifications computed, all the ones of SPECS_LIST for all the columns if None,
+		a list of names for all the columns or a dict {column: list of names} (see get_columns_specs)
+	:param bool float32: True to keep the specifications in float32 and the seasons as int8 codes, halving the memory
+	:param bool memmap: True to write the specifications directly in the file, mapped in memory, instead of holding
+		them in memory (npy format only, without cache)
+	:param str gaps: what is done with the windows with missing rows (see get_gap_windows), without cache and append
+	:param int min_count: the minimum number of rows of a window, see get_gap_windows
+	:param str output_path: the folder where the features are saved
+	:param AggregationPyramid pyramid: the aggregates of df, to compute the windows by combining them (batch mode,
+		without gap policy)
+	:param int min_valid: if given, the NaN values are skipped by all the specifications and the windows with less
+		than min_valid other values get NaN specifications (see compute_specs), without cache and append
+	:param period: the time between two rows of df used by the gap policies, inferred from its dates if None
+		(see get_gap_windows)
 	"""
 	import glob
+	import numpy as np
+	import pandas as pd
+	from Utils.Append import get_protocol_metadata, update_features
+	from Utils.Cache import get_cached_specs
+	from Utils.Get import get_columns_specs, get_gap_windows, get_specs, get_specs_columns, get_y_data
+	from Utils.Store import create_features, get_format, save_features, save_labels
 	# Variables
 	start_time = time.time()
 	df_specs = pd.DataFrame()
-	pickle_filepath = "/Files/Out/Pickles/" + pickle_file
+	pickle_filepath = os.path.join(output_path, pickle_file)
 
+	# from Utils.Graphics import plot_time_slider
 	# files = glob.glob(time_slider_path + "/*")
 	# for f in files:
 	# 	os.remove(f)
 	#
+	# Get the windows once for all the columns and the seasons
+	windows = None
+	if min_valid is not None and (append or cache_path is not None):
+		raise ValueError("The NaN values can not be skipped with the cache or the append mode")
+	if period is not None and gaps not in ("skip", "interpolate"):
+		raise ValueError("The period is only used by the gap policies 'skip' and 'interpolate'")
+	if gaps is not None:
+		if append or cache_path is not None:
+			raise ValueError("The gap policies can not be used with the cache or the append mode")
+		df, windows = get_gap_windows(df, dates, time_window_length, non_overlapping_length, gaps=gaps,
+		                              min_count=min_count, period=period)
+	
 	# Get the specifications of each column
-	for column_name in df.columns:
-		# plot_time_slider(df, column_name, dates,
-		# time_window_length, non_overlapping_length, f"TimeSlider of {column_name}",time_slider_path)
-		# The y_data is changed every time but we only need as many y_data value as the number of row in the dataframe
-		# So no extend, no append etc
-		df_temp = get_specs(df, column_name, dates, time_window_length, non_overlapping_length)
-		df_specs = pd.concat([df_specs, df_temp], axis=1)
-	y_data = get_y_data(dates, time_window_length, non_overlapping_length)
+	if append:
+		update_features(pickle_filepath, df, dates, time_window_length, non_overlapping_length, specs=specs)
+		print(f"total time = {time.time() - start_time}")
+		return
+	dtype = np.float32 if float32 else float
+	if memmap:
+		if get_format(pickle_filepath) != "npy" or cache_path is not None:
+			raise ValueError("The features can only be mapped in memory in the npy format, without cache")
+		y_data = get_y_data(dates, time_window_length, non_overlapping_length, categorical=True, windows=windows)
+		columns_specs = get_columns_specs(list(specs) if isinstance(specs, dict) else list(df.columns), specs)
+		res_columns = [f"{feature}_{signal}" for signal, feature_list in columns_specs.items()
+		               for feature in feature_list]
+		out = create_features(pickle_filepath, len(y_data), res_columns, dtype)
+		get_specs_columns(df, dates, time_window_length, non_overlapping_length, specs=specs, out=out, windows=windows,
+		                  min_valid=min_valid)
+		out.flush()
+		save_labels(pickle_filepath, y_data, res_columns,
+		            get_protocol_metadata(df, dates, time_window_length, non_overlapping_length, specs))
+		print(f"total time = {time.time() - start_time}")
+		return
+	if cache_path is not None:
+		df_specs, y_data = get_cached_specs(df, dates, time_window_length, non_overlapping_length, cache_path,
+		                                    cache_size, specs, categorical=float32)
+		df_specs = df_specs.astype(dtype)
+	elif pyramid is not None and windows is None:
+		df_specs = pyramid.get_specs(dates, time_window_length, non_overlapping_length, specs=specs, dtype=dtype,
+		                             min_valid=min_valid)
+	elif batch:
+		df_specs = get_specs_columns(df, dates, time_window_length, non_overlapping_length, specs=specs, dtype=dtype,
+		                             windows=windows, min_valid=min_valid)
+	else:
+		columns_specs = get_columns_specs(list(specs) if isinstance(specs, dict) else list(df.columns), specs)
+		for column_name in columns_specs:
+			# plot_time_slider(df, column_name, dates,
+			# time_window_length, non_overlapping_length, f"TimeSlider of {column_name}",time_slider_path)
+			# The y_data is changed every time but we only need as many y_data value as the number of row in the dataframe
+			# So no extend, no append etc
+			df_temp = get_specs(df, column_name, dates, time_window_length, non_overlapping_length,
+			                    specs=columns_specs[column_name], dtype=dtype, windows=windows, min_valid=min_valid)
+			df_specs = pd.concat([df_specs, df_temp], axis=1)
+	if cache_path is None:
+		y_data = get_y_data(dates, time_window_length, non_overlapping_length, categorical=float32, windows=windows)
 	# Remove the file in order to create a fresh one
 	if os.path.isfile(pickle_filepath):
 		os.remove(pickle_filepath)
 	
-	with open("."+pickle_filepath, "wb") as f:
-		pickle.dump([df_specs, y_data], f)
+	save_features(pickle_filepath, df_specs, y_data,
+	              get_protocol_metadata(df, dates, time_window_length, non_overlapping_length, specs))
 	
 	end_time = time.time()
 	print(f"total time = {end_time - start_time}")
 
 
-if __name__ == '__main__':
-	file_path_Train = "Files/DailyDelhiClimateTrain.csv"
-	file_path_Test = "Files/DailyDelhiClimateTest.csv"
-	if not (os.path.isfile(file_path_Train) and os.path.isfile(file_path_Test)):
-		print("fichiers manquants")
-		exit()
+
+@profiled
+def run(paths, configurations, dates=None, output_path=os.path.join("Files", "Out", "Pickles"),
+        name="DailyDelhiClimate", file_format="pkl", jobs=1, date_column="date", sep=',', specs=None, float32=False,
+        gaps=None, min_count=None, levels=None, min_valid=None, cache_path=None, cache_size=2 ** 30, append=False,
+        period=None):
+	"""
+	Run the whole pipeline : load the csv files, then for each window configuration extract the specifications,
+	get the seasons and save them
+	:param list paths: the csv files, concatenated in a single dataframe (see get_dataset)
+	:param list configurations: list of (time_window_length, non_overlapping_length) or of
+		(time_window_length, non_overlapping_length, file name), the file being "<name><time_window_length>-
+		<non_overlapping_length>" if not given, the lengths being numbers of days or durations ("6h", "30D", ...)
+	:param list dates: list of 2 elements : the bounds, the first and the last date of the data if None
+	:param str output_path: the folder where the features are saved
+	:param str name: the beginning of the name of the files
+	:param str file_format: "pkl", "parquet" or "npy" (see save_features)
+	:param int jobs: the number of configurations processed at once in a pool of processes (see sweep_protocol),
+		1 to process them one after the other in this process, the number of CPUs if None
+	:param str date_column: the column of the dates
+	:param char sep: the separation character
+	:param specs: the specifications computed, see get_columns_specs
+	:param bool float32: True to keep the specifications in float32 and the seasons as int8 codes
+	:param str gaps: what is done with the windows with missing rows, see get_gap_windows
+	:param int min_count: the minimum number of rows of a window, see get_gap_windows
+	:param list levels: the durations of the buckets of an AggregationPyramid computed once for all the
+		configurations (when jobs is 1), none if None
+	:param int min_valid: the minimum number of values of a window which are not NaN, the NaN values being then
+		skipped (see compute_specs)
+	:param str cache_path: the folder where the results are cached, no cache if None (see protocol, jobs being 1)
+	:param int cache_size: the maximum size of the cache in bytes
+	:param bool append: True to extend the saved features with the new rows instead of computing all of them again
+		(see protocol, jobs being 1)
+	:param period: the time between two rows used by the gap policies, inferred from the dates if None
+		(see get_gap_windows)
+	:return: the saved files
+	:rtype: list
+	"""
+	from Utils.Get import get_dataset
+	from Utils.Sweep import sweep_protocol
 	
 	# Creation and cleaning of variables
-	dataFrame_Train = get_data(file_path_Train, sep=',', txt=False)
-	dataFrame_Test = get_data(file_path_Test, sep=',', txt=False)
+	# We concat all the data to have only one dataframe to use, indexed by date
+	# When a date is in several files, the row of the last file is kept
+	df = get_dataset(paths, date_column=date_column, sep=sep)
+	if dates is None:
+		dates = [str(df.index.min().date()), str(df.index.max().date())]
+	extension = EXTENSIONS[file_format]
+	runs = [(configuration[0], configuration[1],
+	         configuration[2] if len(configuration) > 2 else f"{name}{configuration[0]}-{configuration[1]}")
+	        for configuration in configurations]
+	os.makedirs(output_path, exist_ok=True)
 	
-	# We concat all the data to have only one dataframe to use
-	dataFrame = pd.concat([dataFrame_Train, dataFrame_Test], axis=0).reset_index(drop=True)
-	del (dataFrame_Test, dataFrame_Train)
-	
-	# print("Get information about duplicates and nan in the dataFrame")
-	# print("Nan: ")
-	# print(get_nan(dataFrame))
-	# print("Duplicates: ")
-	# print(get_duplicate(dataFrame, 'date'))
-	
-	# There is one duplicate row :
-	# this is the last row of Train dataset and the first of Test dataset.
-	# We keep the row from Test dataset
-	dataFrame.drop_duplicates(subset=['date'], keep='last', inplace=True)
-	dataFrame = dataFrame.reset_index(drop=True)
+	if period is not None and gaps not in ("skip", "interpolate"):
+		raise ValueError("The period is only used by the gap policies 'skip' and 'interpolate'")
+	if jobs != 1 and (cache_path is not None or append):
+		raise ValueError("The cache and the append mode are only used when the configurations are processed in this "
+		                 "process (jobs = 1)")
+	if jobs == 1:
+		pyramid = None
+		if levels is not None:
+			from Utils.Pyramid import AggregationPyramid
+			pyramid = AggregationPyramid(df, levels)
+		for time_window_length, non_overlapping_length, file_name in runs:
+			protocol(df, dates, time_window_length, non_overlapping_length, file_name + extension, "", specs=specs,
+			         cache_path=cache_path, cache_size=cache_size, append=append, float32=float32, gaps=gaps,
+			         min_count=min_count, output_path=output_path, pyramid=pyramid, min_valid=min_valid,
+			         period=period)
+	else:
+		sweep_protocol({name: df}, [(time_window_length, non_overlapping_length, file_name + extension)
+		                            for time_window_length, non_overlapping_length, file_name in runs],
+		               dates, output_path, jobs, extension, specs, float32, gaps, min_count, min_valid,
+		               period)
+	return [os.path.join(output_path, file_name + extension) for _, _, file_name in runs]
+
+
+def get_length(value):
+	"""
+	Get a window length or step given on the command line
+	:param str value: a number of days or a duration ("6h", "30D", ...)
+	:return: the number of days, or the duration as given
+	:rtype: int or str
+	"""
+	return int(value) if value.isdigit() else value
+
+
+def get_argument_parser():
+	"""
+	Get the parser of the command line arguments of run
+	:return: the parser
+	:rtype: argparse.ArgumentParser
+	"""
+	argument_parser = argparse.ArgumentParser(description="Extract the specifications of the time windows of climate "
+	                                                      "data and their seasons")
+	argument_parser.add_argument("files", nargs="*", default=DEFAULT_FILES,
+	                             help="the csv files, concatenated in a single dataframe (the Delhi files by default)")
+	argument_parser.add_argument("--dates", nargs=2, default=None, metavar=("START", "END"),
+	                             help="the bounds, the first and the last date of the data by default")
+	argument_parser.add_argument("--window", type=get_length, nargs=2, action="append", default=None,
+	                             metavar=("TIME_WINDOW_LENGTH", "NON_OVERLAPPING_LENGTH"),
+	                             help="a window configuration in days or as durations (6h 1h), can be repeated "
+	                                  "(30 7 and 20 5 by default)")
+	argument_parser.add_argument("--output", default=os.path.join("Files", "Out", "Pickles"),
+	                             help="the folder where the features are saved")
+	argument_parser.add_argument("--name", default="DailyDelhiClimate",
+	                             help="the files are named <name><time_window_length>-<non_overlapping_length>")
+	argument_parser.add_argument("--format", choices=list(EXTENSIONS), default="pkl")
+	argument_parser.add_argument("--jobs", type=int, default=1,
+	                             help="the number of window configurations processed at once, 0 for the number of CPUs")
+	argument_parser.add_argument("--date-column", default="date")
+	argument_parser.add_argument("--sep", default=',')
+	argument_parser.add_argument("--specs", nargs="+", default=None, help="the specifications, all of them by default")
+	argument_parser.add_argument("--float32", action="store_true")
+	argument_parser.add_argument("--gaps", choices=["skip", "min_count", "interpolate"], default=None)
+	argument_parser.add_argument("--min-count", type=int, default=None)
+	argument_parser.add_argument("--period", type=get_length, default=None,
+	                             help="the time between two rows for --gaps skip and interpolate, in days or as a "
+	                                  "duration (1h), inferred from the dates by default")
+	argument_parser.add_argument("--min-valid", type=int, default=None,
+	                             help="skip the NaN values, the windows with fewer other values getting NaN features")
+	argument_parser.add_argument("--cache", default=None,
+	                             help="the folder where the features are cached between runs, no cache by default")
+	argument_parser.add_argument("--cache-size", type=int, default=2 ** 30, help="the maximum size of the cache in bytes")
+	argument_parser.add_argument("--append", action="store_true",
+	                             help="extend the saved features with the new rows (npy and parquet formats)")
+	argument_parser.add_argument("--backend", choices=["auto", "numba", "numpy"], default=None,
+	                             help="the backend computing the moments (see Utils.Kernels), numpy by default")
+	argument_parser.add_argument("--levels", nargs="+", default=None,
+	                             help="the durations of the buckets of an aggregation pyramid (1h 1D) used by all the "
+	                                  "windows (without --jobs)")
+	return argument_parser
+
+
+def main(arguments=None):
+	"""
+	Run the pipeline from the command line
+	:param list arguments: the command line arguments, sys.argv if None
+	:return: the saved files
+	:rtype: list
+	"""
+	arguments = get_argument_parser().parse_args(arguments)
+	missing = [path for path in arguments.files if not os.path.isfile(path)]
+	if missing:
+		print(f"fichiers manquants : {missing}")
+		return []
 	
-	# change dtype of date from 'object' to 'datetime' and change the index
-	dataFrame['date'] = pd.to_datetime(dataFrame['date'])
-	dataFrame.set_index("date", inplace=True)
+	from Utils.Kernels import get_backend, set_backend
+	if arguments.backend is not None:
+		set_backend(arguments.backend)
+		# The processes of --jobs choose their backend from the environment
+		os.environ["CLIMATE_BACKEND"] = arguments.backend
+	else:
+		# CLIMATE_BACKEND is checked before any computation
+		get_backend()
 	
-	# First time slider window
-	protocol(dataFrame, dates=['2013-01-01', '2017-04-24'],
-	         time_window_length=30, non_overlapping_length=7, pickle_file="DailyDelhiClimate1.pkl",
-	         time_slider_path="Files/Out/TimeSlider/DimReduc1")
-
-	# Second time slider window
-	protocol(dataFrame, dates=['2013-01-01', '2017-04-24'],
-	         time_window_length=20, non_overlapping_length=5, pickle_file="DailyDelhiClimate2.pkl",
-	         time_slider_path="Files/Out/TimeSlider/DimReduc2")
-	
\ No newline at end of file
+	configurations = DEFAULT_RUNS if arguments.window is None else arguments.window
+	return run(arguments.files, configurations, arguments.dates, arguments.output, arguments.name, arguments.format,
+	           arguments.jobs or None, arguments.date_column, arguments.sep, arguments.specs, arguments.float32,
+	           arguments.gaps, arguments.min_count, arguments.levels, arguments.min_valid, arguments.cache,
+	           arguments.cache_size, arguments.append, arguments.period)
+
+
+if __name__ == '__main__':
+	main()
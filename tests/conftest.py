@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The tests import the modules of the repository as main.py does, from its root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
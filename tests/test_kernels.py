@@ -0,0 +1,145 @@
+import datetime
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from dateutil import parser
+
+from benchmark import get_synthetic_data
+from Utils.Get import SPECS_FUNCTIONS, get_dataset, get_season, get_specs, get_specs_columns, get_y_data
+from Utils.Kernels import _moments_loop, _settings, get_backend, get_numba, set_backend
+from Utils.Specs import SPECS_LIST, Moments
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WINDOWS = [(30, 7), (20, 5)]
+# The tolerance of the numba backend, see compute_moments : relative, and absolute for the skewness and the kurtosis
+RELATIVE_TOLERANCE = 1e-14
+ABSOLUTE_TOLERANCE = 1e-12
+
+
+def get_reference(df, signal, dates, time_window_length, non_overlapping_length):
+	"""
+	Get the specifications as get_specs computed them before the strided windows : a mask of dates by window and
+	the functions get_specs_min, ..., get_specs_ptp
+	:param pd.DataFrame df: the dataframe used
+	:param str signal: the column used as a signal
+	:param list dates: The two dates between which the values are taken
+	:param int time_window_length: The number of date in one window
+	:param int non_overlapping_length: The number of different dates between two window following each other
+	:return pd.DataFrame: The dataframe of extracted specifications
+	"""
+	start = parser.parse(dates[0])
+	maximum = (parser.parse(dates[1]) - start).days + 1
+	res_data = []
+	for i in range(0, maximum - time_window_length, non_overlapping_length):
+		first = start + datetime.timedelta(i)
+		mask = (df.index >= first) & (df.index < first + datetime.timedelta(time_window_length))
+		res_data.append([SPECS_FUNCTIONS[name](df[signal].loc[mask]) for name in SPECS_LIST])
+	return pd.DataFrame(res_data, columns=[f"{name}_{signal}" for name in SPECS_LIST])
+
+
+def get_ulps(res, reference):
+	"""
+	Get the distance between two arrays in units in the last place of the reference
+	:param np.ndarray res: the compared values
+	:param np.ndarray reference: the reference values
+	:return: the largest distance, NaN values being equal
+	:rtype: float
+	"""
+	res, reference = np.asarray(res, dtype=float), np.asarray(reference, dtype=float)
+	assert np.array_equal(np.isnan(res), np.isnan(reference))
+	valid = ~np.isnan(reference)
+	return float(np.max(np.abs(res[valid] - reference[valid]) / np.spacing(np.abs(reference[valid])), initial=0))
+
+
+@pytest.fixture(scope="module", params=["delhi", "hourly"])
+def df(request):
+	if request.param == "delhi":
+		return get_dataset([os.path.join(ROOT, "Files", "DailyDelhiClimateTrain.csv")])
+	return get_synthetic_data(400, 2, "h")
+
+
+@pytest.fixture(params=["numpy", pytest.param("numba", marks=pytest.mark.skipif(get_numba() is None,
+                                                                                 reason="numba is not installed"))])
+def backend(request, monkeypatch):
+	# The backend of the other tests is restored afterwards
+	monkeypatch.setitem(_settings, "backend", _settings["backend"])
+	set_backend(request.param)
+	return request.param
+
+
+def get_dates(df):
+	return [str(df.index.min().date()), str(df.index.max().date())]
+
+
+@pytest.mark.parametrize("time_window_length, non_overlapping_length", WINDOWS)
+def test_backend_matches_get_specs_functions(df, backend, time_window_length, non_overlapping_length):
+	dates = get_dates(df)
+	res = get_specs_columns(df, dates, time_window_length, non_overlapping_length)
+	for signal in df.columns:
+		reference = get_reference(df, signal, dates, time_window_length, non_overlapping_length)
+		for name in SPECS_LIST:
+			column = f"{name}_{signal}"
+			if name in ("skewn", "kurt"):
+				np.testing.assert_allclose(res[column], reference[column], rtol=0, atol=ABSOLUTE_TOLERANCE,
+				                           err_msg=column)
+			else:
+				np.testing.assert_allclose(res[column], reference[column], rtol=RELATIVE_TOLERANCE, err_msg=column)
+
+
+@pytest.mark.parametrize("time_window_length, non_overlapping_length", WINDOWS)
+def test_get_specs_same_dataframe(df, time_window_length, non_overlapping_length, monkeypatch):
+	# The strided windows give the dataframe of the mask of each window : the same values, except the ratios of the
+	# moments of the skewness and the kurtosis, whose powers of m2 are computed for all the windows at once (the
+	# vectorized power may differ by 1 ulp from the one of a single window). The kurtosis is compared before -3,
+	# which cancels out when it is close to 0
+	monkeypatch.setitem(_settings, "backend", "numpy")
+	dates = get_dates(df)
+	for signal in df.columns:
+		reference = get_reference(df, signal, dates, time_window_length, non_overlapping_length)
+		res = get_specs(df, signal, dates, time_window_length, non_overlapping_length)
+		assert list(res.columns) == list(reference.columns)
+		for name in SPECS_LIST:
+			column = f"{name}_{signal}"
+			if name == "kurt":
+				assert get_ulps(res[column] + 3, reference[column] + 3) <= 2, column
+			else:
+				assert get_ulps(res[column], reference[column]) <= (2 if name == "skewn" else 0), column
+
+
+def test_moments_loop_matches_numpy(df):
+	# The loop compiled by the numba backend, run by the interpreter so that it is checked without numba
+	values = np.array(df[df.columns[0]].to_numpy(dtype=float)[:40 * 30].reshape(40, 30))
+	values[3, 5] = np.nan
+	res = np.empty((len(values), 6))
+	_moments_loop(values, res)
+	moments = Moments(values)
+	for i, name in enumerate(["min", "max", "mean", "m2"]):
+		np.testing.assert_allclose(res[:, i], getattr(moments, name), rtol=RELATIVE_TOLERANCE, err_msg=name)
+	# m3 and m4 relative to the powers of the standard deviation, as in the skewness and the kurtosis
+	np.testing.assert_allclose(res[:, 4] / res[:, 3] ** 1.5, moments.m3 / moments.m2 ** 1.5, rtol=0,
+	                           atol=ABSOLUTE_TOLERANCE)
+	np.testing.assert_allclose(res[:, 5] / res[:, 3] ** 2, moments.m4 / moments.m2 ** 2, rtol=0,
+	                           atol=ABSOLUTE_TOLERANCE)
+
+
+@pytest.mark.parametrize("value, error", [("nmba", ValueError),
+                                          pytest.param("numba", ImportError, marks=pytest.mark.skipif(
+	                                          get_numba() is not None, reason="numba is installed"))])
+def test_environment_backend_checked(value, error, monkeypatch):
+	monkeypatch.setenv("CLIMATE_BACKEND", value)
+	monkeypatch.setitem(_settings, "backend", None)
+	with pytest.raises(error):
+		get_backend()
+
+
+@pytest.mark.parametrize("time_window_length, non_overlapping_length", [(1, 1)] + WINDOWS)
+def test_get_y_data_same_labels(time_window_length, non_overlapping_length):
+	dates = ["2015-01-01", "2016-12-31"]
+	start = parser.parse(dates[0])
+	maximum = (parser.parse(dates[1]) - start).days + 1
+	reference = [get_season((start + datetime.timedelta(i)).date())
+	             for i in range(0, maximum - time_window_length, non_overlapping_length)]
+	assert get_y_data(dates, time_window_length, non_overlapping_length) == reference
+	assert list(get_y_data(dates, time_window_length, non_overlapping_length, categorical=True)) == reference
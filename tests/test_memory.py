@@ -0,0 +1,70 @@
+import tracemalloc
+
+import numpy as np
+import pytest
+
+from benchmark import get_synthetic_data
+from Utils.Get import get_gap_windows, get_specs_columns, get_windows
+from Utils.Specs import BLOCK_BYTES
+from Utils.Store import create_features
+
+# A long sub-daily series : a year of minutes, whose 30 days windows moved by 1 day overlap 30 times, so that the
+# temporary arrays of all the windows at once would take several times BLOCK_BYTES
+DAYS = 365
+FREQ = "min"
+TIME_WINDOW_LENGTH = 30
+NON_OVERLAPPING_LENGTH = 1
+
+
+@pytest.fixture(scope="module")
+def df():
+	return get_synthetic_data(DAYS, 1, FREQ)
+
+
+def get_peak(function):
+	"""
+	Get the peak of memory allocated by a function
+	:param function: the function, without parameter
+	:return: the peak in bytes
+	:rtype: int
+	"""
+	tracemalloc.start()
+	try:
+		function()
+		_, peak = tracemalloc.get_traced_memory()
+	finally:
+		tracemalloc.stop()
+	return peak
+
+
+def get_bound(df):
+	# The blocks of windows, plus the copy of the values and the specifications
+	return 2 * BLOCK_BYTES + 4 * df.memory_usage().sum()
+
+
+def test_get_specs_columns_peak(df):
+	dates = [str(df.index[0].date()), str(df.index[-1].date())]
+	peak = get_peak(lambda: get_specs_columns(df, dates, TIME_WINDOW_LENGTH, NON_OVERLAPPING_LENGTH))
+	assert peak < get_bound(df)
+
+
+def test_get_specs_columns_memmap_peak(df, tmp_path):
+	dates = [str(df.index[0].date()), str(df.index[-1].date())]
+	firsts, _ = get_windows(df, dates, TIME_WINDOW_LENGTH, NON_OVERLAPPING_LENGTH)
+	out = create_features(str(tmp_path / "features"), len(firsts), [f"spec{i}" for i in range(8)], np.float32)
+	peak = get_peak(lambda: get_specs_columns(df, dates, TIME_WINDOW_LENGTH, NON_OVERLAPPING_LENGTH, out=out))
+	out.flush()
+	assert peak < get_bound(df)
+	assert not np.isnan(out).any()
+
+
+@pytest.mark.parametrize("gaps, min_count", [("skip", None), ("min_count", 1440 * TIME_WINDOW_LENGTH)])
+def test_gap_windows_peak(df, gaps, min_count):
+	# A missing minute removes the windows containing it : the kept windows are not evenly spaced anymore
+	df = df.drop(df.index[len(df) // 2])
+	dates = [str(df.index[0].date()), str(df.index[-1].date())]
+	df, windows = get_gap_windows(df, dates, TIME_WINDOW_LENGTH, NON_OVERLAPPING_LENGTH, gaps=gaps,
+	                              min_count=min_count)
+	assert len(windows[0]) < len(get_windows(df, dates, TIME_WINDOW_LENGTH, NON_OVERLAPPING_LENGTH)[0])
+	peak = get_peak(lambda: get_specs_columns(df, dates, TIME_WINDOW_LENGTH, NON_OVERLAPPING_LENGTH, windows=windows))
+	assert peak < get_bound(df)
@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmark import get_synthetic_data
+from Utils.Get import get_specs_columns
+from Utils.Pyramid import AggregationPyramid
+from Utils.Specs import SPECS_LIST
+
+# The tolerance of AggregationPyramid : relative, and absolute for the skewness and the kurtosis, plus
+# CONDITIONING * eps * |mean| / std for the windows with a tiny variance compared to their mean
+TOLERANCE = 1e-9
+CONDITIONING = 10
+
+
+def get_minutes(values):
+	return pd.DataFrame({"signal": values}, index=pd.date_range("2000-01-01", periods=len(values), freq="min",
+	                                                            name="date"))
+
+
+def get_humidity():
+	# Humidity rounded to 0.1 with saturated days at 99.9 / 100.0 : windows of a tiny variance far from the mean
+	rng = np.random.default_rng(0)
+	minutes = np.arange(60 * 1440)
+	values = np.round(70 + 20 * np.sin(2 * np.pi * minutes / 1440) + rng.normal(scale=3, size=len(minutes)), 1)
+	values[10 * 1440:16 * 1440] = rng.choice([99.9, 100.0], size=6 * 1440)
+	return get_minutes(np.clip(values, 0, 100))
+
+
+def get_offset():
+	# A high level with a small noise, after a segment 1e3 above it
+	rng = np.random.default_rng(0)
+	values = 1e5 + rng.normal(scale=1e-3, size=20 * 1440)
+	values[:5 * 1440] += 1e3
+	return get_minutes(values)
+
+
+def assert_pyramid_close(df, time_window_length, non_overlapping_length, levels=("1h", "1D"), min_valid=None):
+	dates = [str(df.index[0].date()), str(df.index[-1].date())]
+	reference = get_specs_columns(df, dates, time_window_length, non_overlapping_length, min_valid=min_valid)
+	res = AggregationPyramid(df, levels).get_specs(dates, time_window_length, non_overlapping_length,
+	                                               min_valid=min_valid)
+	assert list(res.columns) == list(reference.columns)
+	for signal in df.columns:
+		with np.errstate(all="ignore"):
+			conditioning = CONDITIONING * np.finfo(float).eps * np.abs(reference[f"mean_{signal}"]) / \
+				reference[f"std_{signal}"]
+		conditioning = np.nan_to_num(conditioning, nan=0.0, posinf=0.0)
+		for name in SPECS_LIST:
+			column = f"{name}_{signal}"
+			assert np.array_equal(np.isnan(res[column]), np.isnan(reference[column])), column
+			difference = np.abs(res[column] - reference[column])
+			if name in ("skewn", "kurt"):
+				bound = TOLERANCE + conditioning
+			else:
+				bound = (TOLERANCE + conditioning) * np.abs(reference[column])
+			assert (difference[~np.isnan(difference)] <= bound[~np.isnan(difference)]).all(), column
+
+
+@pytest.mark.parametrize("time_window_length, non_overlapping_length", [("2D", "1D"), (7, 1), ("6h", "1h")])
+def test_low_variance_offset_windows(time_window_length, non_overlapping_length):
+	assert_pyramid_close(get_humidity(), time_window_length, non_overlapping_length)
+	assert_pyramid_close(get_offset(), time_window_length, non_overlapping_length)
+
+
+def test_synthetic_data():
+	assert_pyramid_close(get_synthetic_data(120, 3, "min"), 30, 7)
+
+
+def test_nan_values():
+	df = get_synthetic_data(60, 2, "h")
+	df.iloc[100, 0] = np.nan
+	df.iloc[200:230, 1] = np.nan
+	# The NaN values are skipped with min_valid, else they give NaN specifications as on the rows
+	assert_pyramid_close(df, 7, 1, levels=["1D"], min_valid=1)
+	assert_pyramid_close(df, "1D", "1D", levels=["1D"], min_valid=20)
+	dates = [str(df.index[0].date()), str(df.index[-1].date())]
+	pd.testing.assert_frame_equal(AggregationPyramid(df, ["1D"]).get_specs(dates, 7, 1),
+	                              get_specs_columns(df, dates, 7, 1))
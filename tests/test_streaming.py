@@ -0,0 +1,41 @@
+import os
+
+import numpy as np
+import pytest
+
+from Utils.Get import get_dataset, get_specs_columns, get_windows_firsts
+from Utils.Streaming import StreamingSpecs
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The tolerance of StreamingSpecs : relative, and absolute for the skewness and the kurtosis
+RELATIVE_TOLERANCE = 1e-12
+ABSOLUTE_TOLERANCE = 1e-10
+
+
+@pytest.fixture(scope="module")
+def df():
+	df = get_dataset([os.path.join(ROOT, "Files", "DailyDelhiClimateTrain.csv")])
+	# Missing values of one signal, a row without any value and an outlier which leaves the windows
+	df.iloc[[50, 51, 300], 0] = np.nan
+	df.iloc[600, :] = np.nan
+	df.iloc[400, 1] = 5000.0
+	return df
+
+
+@pytest.mark.parametrize("time_window_length, non_overlapping_length", [(30, 7), (20, 5), ("6D", "2D"), (60, 1)])
+def test_streaming_matches_get_specs_columns(df, time_window_length, non_overlapping_length):
+	dates = [str(df.index[0].date()), str(df.index[-1].date())]
+	reference = get_specs_columns(df, dates, time_window_length, non_overlapping_length)
+	res = StreamingSpecs(dates[0], time_window_length, non_overlapping_length, df.columns).update(df)
+	# The stream also gives the window ending with the last row, which get_specs_columns leaves out
+	firsts, _ = get_windows_firsts(dates, time_window_length, non_overlapping_length)
+	assert (res.index[:len(reference)] == firsts).all()
+	assert list(res.columns) == list(reference.columns)
+	for column in reference:
+		expected = reference[column].to_numpy()
+		actual = res[column].to_numpy()[:len(reference)]
+		assert np.array_equal(np.isnan(actual), np.isnan(expected)), column
+		if column.split("_")[0] in ("skewn", "kurt"):
+			np.testing.assert_allclose(actual, expected, rtol=0, atol=ABSOLUTE_TOLERANCE, err_msg=column)
+		else:
+			np.testing.assert_allclose(actual, expected, rtol=RELATIVE_TOLERANCE, err_msg=column)